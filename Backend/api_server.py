@@ -1,11 +1,17 @@
-from flask import Flask, request, jsonify, abort
+from flask import Flask, Response, request, jsonify, abort, stream_with_context
 from flask_cors import CORS
 from deadline_extractor import DeadlineExtractor
-from deadline_storage import DeadlineStorage
-from email_reader import EmailReader
+from deadline_storage import ShardedDeadlineStorage
+from sync_jobs import SyncJobManager, SyncQueueFullError
 from notification_engine import NotificationEngine
-import json
+from notification_hub import NotificationHub, EventLog, format_sse
+from leader_election import LeaderElection
+from date_utils import parse_date
+from response_encoding import ResponseCache
+import response_encoding
+import metrics
 import os
+import hashlib
 import threading
 
 # Initialize the Flask app
@@ -13,18 +19,53 @@ app = Flask(__name__)
 CORS(app)  # Enable CORS to allow React Native to connect
 
 # Initialize components
-storage = DeadlineStorage("deadlines.json")
+# One storage shard per mailbox; requests without an account keep using deadlines.json
+storage = ShardedDeadlineStorage("shards", default_storage_file="deadlines.json")
 extractor = DeadlineExtractor()
+# Job state lives in files so any worker can answer for a job another one runs
+sync_jobs = SyncJobManager(extractor, storage, max_workers=2, state_dir="sync_state")
+
+# Push notifications to connected clients over Server-Sent Events
+notification_hub = NotificationHub(queue_size=100, history_size=1000)
+
+# Seconds between keep-alive comments on idle event streams
+SSE_HEARTBEAT_SECONDS = 15
+
+# Notifications reach the clients of every worker through a shared event log
+notification_events = EventLog("notification_events.jsonl")
 
 # Set up the notification handler
 def handle_notification(notification):
-    # This will be used later with WebSockets
-    pass
+    notification_events.append(notification)
+
+# Minutes between the scheduler's checks for deadlines changed by other workers
+SCHEDULER_RESYNC_MINUTES = 0.5
+
+# Initialize notification engine; it only runs in the elected worker
+notification_engine = NotificationEngine(storage, delivery_metrics_file="delivery_metrics.json")
+notification_engine.add_notification_handler(handle_notification, name="sse", timeout=5)
+scheduler_election = LeaderElection(
+    "scheduler.lock",
+    on_elected=lambda: notification_engine.start(check_interval_minutes=SCHEDULER_RESYNC_MINUTES),
+    on_demoted=notification_engine.stop
+)
+
+def start_background_services():
+    """Start the per-process background threads.
+
+    Call once in every worker after it has started (not before forking):
+    each follows the shared event log, and one of them is elected to run
+    the notification scheduler. If that worker dies, another takes over.
+    """
+    notification_events.start(notification_hub)
+    scheduler_election.start()
+    metrics.shared.start()
 
-# Initialize notification engine
-notification_engine = NotificationEngine(storage)
-notification_engine.add_notification_handler(handle_notification)
-notification_engine.start(check_interval_minutes=15)
+# Largest page size for paginated deadline lists
+MAX_PAGE_SIZE = 500
+
+# Encoded bodies of repeated deadline requests, keyed by storage version
+response_cache = ResponseCache(max_entries=512, max_bytes=32 * 1024 * 1024)
 
 # API Authentication (simple token for now)
 API_TOKEN = "your-secure-token"  # Change this to a secure token
@@ -38,34 +79,206 @@ def require_token(f):
     decorated_function.__name__ = f.__name__
     return decorated_function
 
+def _request_account():
+    """The calling account from the X-Account header or account query parameter.
+    
+    None selects the default shard (deadlines.json), which holds data
+    stored before per-account shards; see migrate_default_shard.py.
+    """
+    return request.headers.get('X-Account') or request.args.get('account')
+
+def account_storage(account=None):
+    """Get the storage shard for the calling account, see _request_account."""
+    if account is None:
+        account = _request_account()
+    return storage.for_account(account)
+
+def _split_arg(name):
+    value = request.args.get(name)
+    if not value:
+        return None
+    return [part.strip() for part in value.split(',') if part.strip()]
+
+def _project(deadline, fields):
+    projected = {'id': deadline.get('id')}
+    for field in fields:
+        if field in deadline:
+            projected[field] = deadline[field]
+    return projected
+
+def _storage_etag(shard, version):
+    """Build an ETag from a version of the shard and the request's shard and query"""
+    key = f"{shard.storage_file}?{request.query_string.decode('utf-8', 'replace')}"
+    digest = hashlib.sha1(key.encode('utf-8')).hexdigest()[:12]
+    return f"v{version}-{digest}"
+
+def _not_modified(etag):
+    response = Response(status=304)
+    response.set_etag(etag)
+    response.vary.update(('Accept', 'Accept-Encoding'))
+    return response
+
+def _respond(build, status=200, shard=None, with_etag=False):
+    """Encode build()'s (data, extra headers) in the representation the client asked for.
+    
+    The body is JSON, or MessagePack if the client accepts it, and is
+    compressed with br or gzip above a size threshold. With a shard, the
+    encoded body is cached under the shard's version, so identical requests
+    skip building and encoding until the storage changes. with_etag adds an
+    ETag for that version, specific to the representation, and checks it
+    against If-None-Match.
+    
+    The version is read once. If the shard changes while build() runs, the
+    body is newer than that version, so it is sent without ETag and not
+    cached.
+    """
+    media_type, encoding = response_encoding.negotiate(request.accept_mimetypes,
+                                                       request.accept_encodings)
+    version = shard.get_version() if shard is not None else None
+    etag = None
+    if with_etag and shard is not None:
+        etag = response_encoding.variant_etag(_storage_etag(shard, version), media_type, encoding)
+        if request.if_none_match.contains(etag):
+            return _not_modified(etag)
+    
+    key = None
+    encoded = None
+    if shard is not None:
+        key = (shard.storage_file, version, request.path,
+               request.query_string, media_type, encoding)
+        encoded = response_cache.get(key)
+    if encoded is None:
+        data, headers = build()
+        if shard is not None and shard.get_version() != version:
+            key = None
+            etag = None
+        encoded = response_encoding.encode(data, media_type, encoding, headers)
+        if key is not None:
+            response_cache.put(key, encoded)
+    
+    response = Response(encoded.body, status=status, content_type=encoded.media_type)
+    if encoded.encoding:
+        response.headers['Content-Encoding'] = encoded.encoding
+    response.headers.update(encoded.headers)
+    response.vary.update(('Accept', 'Accept-Encoding'))
+    if etag is not None:
+        response.set_etag(etag)
+    return response
+
+def _parse_date_arg(name):
+    """Parse a date query parameter to naive local time, like stored deadlines"""
+    value = request.args.get(name)
+    if not value:
+        return None
+    parsed = parse_date(value)
+    if parsed is None:
+        raise ValueError(f"Invalid date for {name}")
+    return parsed
+
 # API Routes
 @app.route('/api/deadlines', methods=['GET'])
 @require_token
 def get_deadlines():
-    deadlines = storage.get_all_deadlines()
-    return jsonify(deadlines)
+    """List deadlines with optional filters, projection and cursor pagination.
+    
+    Query parameters: start/end (ISO dates), confidence (comma separated),
+    sender, fields (comma separated), limit and cursor. The body is an
+    array; X-Next-Cursor is set when there are more pages.
+    """
+    shard = account_storage()
+    
+    def build():
+        try:
+            start = _parse_date_arg('start')
+            end = _parse_date_arg('end')
+        except ValueError:
+            return abort(400, description="start and end must be ISO dates")
+        
+        limit = request.args.get('limit', type=int)
+        if limit is not None:
+            limit = max(1, min(limit, MAX_PAGE_SIZE))
+        
+        try:
+            records, next_cursor = shard.query_records(
+                start=start,
+                end=end,
+                confidences=_split_arg('confidence'),
+                sender=request.args.get('sender'),
+                cursor=request.args.get('cursor'),
+                limit=limit
+            )
+        except ValueError:
+            return abort(400, description="Invalid cursor")
+        
+        fields = _split_arg('fields')
+        if fields:
+            data = [_project(record.to_dict(), fields) for record in records]
+        else:
+            data = [record.to_dict() for record in records]
+        return data, {'X-Next-Cursor': next_cursor} if next_cursor else None
+    
+    # Answer revalidations from the version counter alone
+    return _respond(build, shard=shard, with_etag=True)
 
 @app.route('/api/deadlines/upcoming', methods=['GET'])
 @require_token
 def get_upcoming_deadlines():
     hours = request.args.get('hours', default=24, type=int)
-    deadlines = storage.get_upcoming_deadlines(hours_ahead=hours)
-    return jsonify(deadlines)
+    records = account_storage().get_upcoming_records(hours_ahead=hours)
+    # Not cached: the window moves with the clock, not the storage version
+    return _respond(lambda: ([record.to_dict() for record in records], None))
+
+@app.route('/api/deadlines/history', methods=['GET'])
+@require_token
+def get_deadline_history():
+    """Get archived (past) deadlines, optionally within a date range"""
+    try:
+        start = _parse_date_arg('start')
+        end = _parse_date_arg('end')
+    except ValueError:
+        return abort(400, description="start and end must be ISO dates")
+    
+    shard = account_storage()
+    # Archiving always rewrites the hot store, so its version covers the archive too
+    return _respond(lambda: (shard.get_archived_deadlines(start=start, end=end), None), shard=shard)
+
+@app.route('/api/deadlines/changes', methods=['GET'])
+@require_token
+def get_deadline_changes():
+    """Get deadlines added, updated or deleted since a change cursor.
+    
+    Clients start with since=0 (a full snapshot with reset=true) and then
+    pass back the cursor from each response.
+    """
+    since = request.args.get('since', default=0, type=int)
+    shard = account_storage()
+    
+    def build():
+        changes = shard.get_changes(since=since)
+        changes["upserted"] = [record.to_dict() for record in changes["upserted"]]
+        return changes, None
+    
+    return _respond(build, shard=shard)
 
 @app.route('/api/deadlines/<deadline_id>', methods=['GET'])
 @require_token
 def get_deadline(deadline_id):
-    deadlines = storage.get_all_deadlines()
-    for deadline in deadlines:
-        if deadline.get('id') == deadline_id:
-            return jsonify(deadline)
-    return abort(404, description="Deadline not found")
+    shard = account_storage()
+    
+    def build():
+        deadline = shard.get_deadline(deadline_id)
+        if deadline is None:
+            return abort(404, description="Deadline not found")
+        fields = _split_arg('fields')
+        return (_project(deadline, fields) if fields else deadline), None
+    
+    return _respond(build, shard=shard, with_etag=True)
 
 @app.route('/api/deadlines/<deadline_id>', methods=['PUT'])
 @require_token
 def update_deadline(deadline_id):
     updated_data = request.json
-    success = storage.update_deadline(deadline_id, updated_data)
+    success = account_storage().update_deadline(deadline_id, updated_data)
     if success:
         return jsonify({"success": True})
     return abort(404, description="Failed to update deadline")
@@ -73,7 +286,7 @@ def update_deadline(deadline_id):
 @app.route('/api/deadlines/<deadline_id>', methods=['DELETE'])
 @require_token
 def delete_deadline(deadline_id):
-    success = storage.delete_deadline(deadline_id)
+    success = account_storage().delete_deadline(deadline_id)
     if success:
         return jsonify({"success": True})
     return abort(404, description="Failed to delete deadline")
@@ -84,13 +297,22 @@ def extract_from_email():
     """Extract deadlines from a single email"""
     email_data = request.json
     deadlines = extractor.extract_deadlines(email_data)
-    count = storage.add_multiple_deadlines(deadlines)
-    return jsonify({"added": count, "deadlines": deadlines})
+    result = account_storage().upsert_deadlines(deadlines)
+    return jsonify({
+        "added": len(result["added"]),
+        "merged": len(result["merged"]),
+        "rejected": len(result["rejected"]),
+        "deadlines": deadlines
+    })
 
 @app.route('/api/sync/emails', methods=['POST'])
 @require_token
 def sync_emails():
-    """Sync emails from IMAP server and extract deadlines"""
+    """Start a background sync of emails from an IMAP server, returns the job.
+    
+    Deadlines go to the calling account's shard, the same one reads use,
+    whichever mailbox is synced.
+    """
     data = request.json
     email_address = data.get('email')
     password = data.get('password')
@@ -100,23 +322,78 @@ def sync_emails():
     if not email_address or not password:
         return abort(400, description="Email and password required")
     
-    reader = EmailReader(email_address, password, imap_server=imap_server)
-    emails = reader.get_recent_emails(days=days)
+    try:
+        job, created = sync_jobs.submit(email_address, password, imap_server=imap_server, days=days,
+                                        storage_account=_request_account())
+    except SyncQueueFullError as e:
+        return abort(503, description=str(e))
     
-    added_count = 0
-    extracted_deadlines = []
+    job["status_url"] = f"/api/sync/jobs/{job['id']}"
+    return _respond(lambda: (job, None), status=202 if created else 200)
+
+@app.route('/api/sync/jobs/<job_id>', methods=['GET'])
+@require_token
+def get_sync_job(job_id):
+    """Get the progress and partial results of a sync job"""
+    job = sync_jobs.get_job(job_id)
+    if job is None:
+        return abort(404, description="Sync job not found")
+    # Job progress changes without a storage version bump, so it is not cached
+    return _respond(lambda: (job, None))
+
+@app.route('/api/notifications/stream', methods=['GET'])
+@require_token
+def stream_notifications():
+    """Stream notifications as Server-Sent Events.
     
-    for email_data in emails:
-        deadlines = extractor.extract_deadlines(email_data)
-        count = storage.add_multiple_deadlines(deadlines)
-        added_count += count
-        extracted_deadlines.extend(deadlines)
+    Reconnecting clients send Last-Event-ID (or ?last_event_id=) to get the
+    events they missed.
+    """
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        return abort(400, description="Invalid Last-Event-ID")
     
-    return jsonify({
-        "processed_emails": len(emails),
-        "added_deadlines": added_count,
-        "deadlines": extracted_deadlines
+    subscription = notification_hub.subscribe(last_event_id)
+    
+    def generate():
+        try:
+            yield f"retry: {SSE_HEARTBEAT_SECONDS * 1000}\n\n"
+            while True:
+                event = subscription.get(timeout=SSE_HEARTBEAT_SECONDS)
+                if event is None:
+                    yield ": heartbeat\n\n"
+                else:
+                    yield format_sse(event)
+        finally:
+            notification_hub.unsubscribe(subscription)
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
     })
 
+@app.route('/api/notifications/delivery/metrics', methods=['GET'])
+@require_token
+def get_delivery_metrics():
+    """Get per-handler notification delivery metrics.
+    
+    Only the worker running the scheduler delivers; the others report what
+    it last published, at most SCHEDULER_RESYNC_MINUTES old.
+    """
+    return jsonify(notification_engine.get_delivery_metrics())
+
+@app.route('/metrics', methods=['GET'])
+@require_token
+def get_metrics():
+    """Latency histograms and error counters in Prometheus text format.
+    
+    With IMPEMAIL_METRICS_DIR set (gunicorn.conf.py does), the figures
+    cover every worker process, whichever one answers the scrape.
+    """
+    return Response(metrics.shared.render(), mimetype='text/plain; version=0.0.4')
+
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000)
\ No newline at end of file
+    start_background_services()
+    app.run(host='0.0.0.0', port=5000, threaded=True)
\ No newline at end of file
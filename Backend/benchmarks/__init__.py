@@ -0,0 +1,8 @@
+"""Reproducible benchmarks for the deadline system.
+
+Everything runs locally: synthetic mail is served by a fake IMAP server and
+extraction goes to a stub Ollama server, so results do not depend on a real
+mailbox or model. Run from the Backend directory:
+
+    python -m benchmarks.run --output benchmark_results.json
+"""
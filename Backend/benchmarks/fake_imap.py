@@ -0,0 +1,100 @@
+import time
+import threading
+import socketserver
+from typing import List
+
+class _IMAPHandler(socketserver.StreamRequestHandler):
+    """Just enough IMAP4rev1 for EmailReader: LOGIN, SELECT, SEARCH, FETCH RFC822."""
+    # Small response lines would otherwise wait on delayed ACKs
+    disable_nagle_algorithm = True
+
+    def handle(self):
+        self._send(b"* OK [CAPABILITY IMAP4rev1] Fake IMAP ready")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            parts = line.decode(errors='replace').rstrip("\r\n").split(" ", 2)
+            if len(parts) < 2:
+                self._send(b"* BAD Invalid command")
+                continue
+            tag, command = parts[0], parts[1].upper()
+            args = parts[2] if len(parts) > 2 else ""
+
+            if command == "CAPABILITY":
+                self._send(b"* CAPABILITY IMAP4rev1")
+                self._ok(tag, command)
+            elif command in ("LOGIN", "NOOP", "CLOSE"):
+                self._ok(tag, command)
+            elif command == "SELECT":
+                self._send(b"* FLAGS (\\Seen)")
+                self._send(f"* {len(self.server.messages)} EXISTS".encode())
+                self._send(f"{tag} OK [READ-WRITE] SELECT completed".encode())
+            elif command == "SEARCH":
+                ids = " ".join(str(i) for i in range(1, len(self.server.messages) + 1))
+                self._send(f"* SEARCH {ids}".rstrip().encode())
+                self._ok(tag, command)
+            elif command == "FETCH":
+                self._fetch(tag, args.split(" ", 1)[0])
+            elif command == "LOGOUT":
+                self._send(b"* BYE Logging out")
+                self._ok(tag, command)
+                return
+            else:
+                self._send(f"{tag} BAD Unsupported command".encode())
+
+    def _fetch(self, tag: str, message_set: str):
+        if self.server.fetch_latency:
+            time.sleep(self.server.fetch_latency)
+        for number in message_set.split(","):
+            index = int(number) - 1 if number.isdigit() else -1
+            if not 0 <= index < len(self.server.messages):
+                self._send(f"{tag} NO No such message".encode())
+                return
+            raw = self.server.messages[index]
+            self.wfile.write(f"* {number} FETCH (RFC822 {{{len(raw)}}}\r\n".encode() + raw + b")\r\n")
+        self._ok(tag, "FETCH")
+
+    def _ok(self, tag: str, command: str):
+        self._send(f"{tag} OK {command} completed".encode())
+
+    def _send(self, line: bytes):
+        self.wfile.write(line + b"\r\n")
+
+class FakeIMAPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, messages: List[bytes], host="127.0.0.1", port=0, fetch_latency=0.0):
+        """Serve messages (raw RFC822 bytes) over plain IMAP on a local port.
+
+        Any credentials are accepted. fetch_latency adds a delay in seconds
+        to every FETCH, to simulate a remote server. port=0 picks a free port.
+        """
+        super().__init__((host, port), _IMAPHandler)
+        self.messages = messages
+        self.fetch_latency = fetch_latency
+        self.thread = None
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    def start(self):
+        """Serve in a background thread."""
+        self.thread = threading.Thread(target=self.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving and close the socket."""
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+        return False
@@ -0,0 +1,104 @@
+import random
+import datetime
+from email.message import EmailMessage
+from email.utils import format_datetime
+from typing import List, Dict, Any, Tuple
+
+WORDS = (
+    "project meeting update review team client budget schedule draft report "
+    "design proposal feedback release planning quarterly summary notes agenda "
+    "contract invoice training workshop research analysis presentation follow "
+    "please thanks regards attached details below question status change"
+).split()
+
+TASKS = ("submit the", "review the", "send the", "finalize the", "pay the", "sign the")
+DOCUMENTS = ("report", "invoice", "proposal", "contract", "slides", "timesheet", "budget")
+
+def _filler(rng: random.Random, size: int) -> str:
+    """Plain English-looking text of roughly size characters."""
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return " ".join(words)
+
+def _deadline_sentence(rng: random.Random, index: int, number: int, now: datetime.datetime) -> Tuple[str, Dict[str, Any]]:
+    """A sentence announcing a deadline, and the deadline it announces."""
+    due = now + datetime.timedelta(days=rng.randint(1, 60), hours=rng.randint(0, 23))
+    due = due.replace(minute=0, second=0, microsecond=0)
+    task = f"{rng.choice(TASKS)} {rng.choice(DOCUMENTS)} #{index:06d}-{number}"
+    sentence = f"Please {task} by {due.strftime('%Y-%m-%dT%H:%M')}."
+    return sentence, {"task": task, "deadline": due.isoformat()}
+
+def generate_email(index: int, rng: random.Random, body_size=2000, attachment_ratio=0.2,
+                   attachment_size=50000, deadline_density=0.5, html_ratio=0.3,
+                   now=None) -> Tuple[bytes, List[Dict[str, Any]]]:
+    """Build one RFC822 message, returns (raw bytes, deadlines it contains).
+
+    deadline_density is the average number of deadlines per email; a
+    fraction of messages get an HTML alternative (html_ratio) or a binary
+    attachment of attachment_size bytes (attachment_ratio).
+    """
+    now = now or datetime.datetime.now()
+    count = int(deadline_density) + (1 if rng.random() < deadline_density % 1 else 0)
+
+    paragraphs = [_filler(rng, body_size // (count + 1)) for _ in range(count + 1)]
+    deadlines = []
+    for number in range(count):
+        sentence, deadline = _deadline_sentence(rng, index, number, now)
+        paragraphs.insert(2 * number + 1, sentence)
+        deadlines.append(deadline)
+    body = "\n\n".join(paragraphs)
+
+    message = EmailMessage()
+    message["Subject"] = f"{rng.choice(WORDS).title()} {rng.choice(WORDS)} #{index}"
+    message["From"] = f"Sender {index % 50} <sender{index % 50}@example.com>"
+    message["To"] = "me@example.com"
+    message["Date"] = format_datetime(now - datetime.timedelta(minutes=index))
+    message["Message-ID"] = f"<bench-{index}@example.com>"
+    message.set_content(body)
+
+    if rng.random() < html_ratio:
+        message.add_alternative(f"<html><body><p>{body.replace(chr(10), '<br>')}</p></body></html>", subtype="html")
+    if rng.random() < attachment_ratio:
+        message.add_attachment(rng.randbytes(attachment_size), maintype="application",
+                               subtype="pdf", filename=f"attachment-{index}.pdf")
+
+    return message.as_bytes(), deadlines
+
+def generate_mailbox(count: int, seed=0, **options) -> Tuple[List[bytes], List[Dict[str, Any]]]:
+    """Generate count messages, returns (raw messages, all deadlines they contain).
+
+    The same seed and options always give the same mailbox.
+    """
+    rng = random.Random(seed)
+    now = datetime.datetime.now().replace(minute=0, second=0, microsecond=0)
+    messages = []
+    deadlines = []
+    for index in range(count):
+        raw, found = generate_email(index, rng, now=now, **options)
+        messages.append(raw)
+        deadlines.extend(found)
+    return messages, deadlines
+
+def generate_deadline_dicts(count: int, seed=0, start=0, days_ahead=90) -> List[Dict[str, Any]]:
+    """Generate stored-deadline dicts with distinct tasks, for storage scenarios."""
+    rng = random.Random(seed)
+    now = datetime.datetime.now().replace(microsecond=0)
+    deadlines = []
+    for index in range(start, start + count):
+        due = now + datetime.timedelta(minutes=rng.randint(60, days_ahead * 24 * 60))
+        deadlines.append({
+            "id": f"dl_bench_{index:08d}",
+            "task": f"{rng.choice(TASKS)} {rng.choice(DOCUMENTS)} #{index:08d}",
+            "deadline": due.isoformat(),
+            "details": _filler(rng, 80),
+            "confidence": rng.choice(("high", "medium", "low")),
+            "source_email_id": str(index),
+            "source_email_subject": f"Subject {index}",
+            "source_email_from": f"sender{index % 50}@example.com",
+            "extraction_time": now.isoformat()
+        })
+    return deadlines
@@ -0,0 +1,101 @@
+import io
+import sys
+import json
+import argparse
+import platform
+import datetime
+import subprocess
+import contextlib
+from typing import Dict, Any, Optional
+
+from benchmarks.scenarios import SCENARIOS, QUICK
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_scenarios(names, quick=False, overrides=None, verbose=False) -> Dict[str, Any]:
+    """Run the named scenarios, returns results with enough metadata to compare runs."""
+    results = {
+        "meta": {
+            "timestamp": datetime.datetime.now().isoformat(),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "quick": quick
+        },
+        "scenarios": {}
+    }
+
+    for name in names:
+        params = dict(QUICK.get(name, {})) if quick else {}
+        params.update((overrides or {}).get(name, {}))
+        print(f"Running {name} {params or ''}...", file=sys.stderr)
+
+        # The code under test prints as it goes; keep that out of the timings
+        output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+        with output:
+            result = SCENARIOS[name](**params)
+        results["scenarios"][name] = {"params": params, "results": result}
+
+    return results
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], prefix="") -> Dict[str, float]:
+    """Ratio current/baseline for every numeric result both runs have."""
+    ratios = {}
+    for key, value in current.items():
+        old = baseline.get(key) if isinstance(baseline, dict) else None
+        path = f"{prefix}{key}"
+        if isinstance(value, dict) and isinstance(old, dict):
+            ratios.update(compare(old, value, path + "."))
+        elif isinstance(value, list) and isinstance(old, list):
+            for index, (old_item, item) in enumerate(zip(old, value)):
+                if isinstance(item, dict) and isinstance(old_item, dict):
+                    ratios.update(compare(old_item, item, f"{path}[{index}]."))
+        elif (isinstance(value, (int, float)) and isinstance(old, (int, float))
+              and not isinstance(value, bool) and old):
+            ratios[path] = round(value / old, 3)
+    return ratios
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run deadline system benchmarks")
+    parser.add_argument("scenarios", nargs="*", metavar="scenario",
+                        help=f"Scenarios to run (default: all): {', '.join(SCENARIOS)}")
+    parser.add_argument("--quick", action="store_true", help="Use small parameters for a fast sanity run")
+    parser.add_argument("--storage-sizes", help="Comma-separated store sizes, e.g. 10000,100000,1000000")
+    parser.add_argument("--llm-latency", type=float, help="Seconds the stub LLM takes per call")
+    parser.add_argument("--output", default="benchmark_results.json", help="Where to write the JSON results")
+    parser.add_argument("--baseline", help="Earlier results file to compare against")
+    parser.add_argument("--verbose", action="store_true", help="Show output from the code under test")
+    args = parser.parse_args(argv)
+
+    names = args.scenarios or list(SCENARIOS)
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenario: {', '.join(unknown)}")
+    overrides = {}
+    if args.storage_sizes:
+        overrides["deadline_storage"] = {"sizes": [int(size) for size in args.storage_sizes.split(",")]}
+    if args.llm_latency is not None:
+        for name in ("deadline_extractor", "sync_pipeline", "notification_engine"):
+            overrides.setdefault(name, {})["llm_latency"] = args.llm_latency
+
+    results = run_scenarios(names, quick=args.quick, overrides=overrides, verbose=args.verbose)
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(json.dumps(results["scenarios"], indent=2))
+    print(f"Results written to {args.output}", file=sys.stderr)
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        print("\nRatio to baseline (current / baseline):")
+        for path, ratio in compare(baseline["scenarios"], results["scenarios"]).items():
+            print(f"  {path}: {ratio}")
+
+if __name__ == "__main__":
+    main()
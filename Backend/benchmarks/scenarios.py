@@ -0,0 +1,353 @@
+import os
+import gc
+import random
+import time
+import shutil
+import tempfile
+import threading
+import tracemalloc
+import datetime
+from typing import Dict, Any, List
+import dateutil.parser
+
+from email_reader import EmailReader
+from deadline_extractor import DeadlineExtractor
+from deadline_record import Deadline, encode_store
+from deadline_storage import DeadlineStorage
+from notification_engine import NotificationEngine
+from sync_pipeline import SyncPipeline
+import date_utils
+
+from benchmarks.mail_generator import generate_mailbox, generate_deadline_dicts
+from benchmarks.fake_imap import FakeIMAPServer
+from benchmarks.stub_ollama import StubOllamaServer
+
+def _rate(count: float, seconds: float) -> float:
+    return round(count / seconds, 2) if seconds > 0 else None
+
+def _seconds(value: float) -> float:
+    return round(value, 6)
+
+def email_reader(messages=500, body_size=2000, attachment_ratio=0.2, attachment_size=50000,
+                 fetch_latency=0.0, seed=0) -> Dict[str, Any]:
+    """Fetch and parse a synthetic mailbox from the fake IMAP server."""
+    mailbox, _ = generate_mailbox(messages, seed=seed, body_size=body_size,
+                                  attachment_ratio=attachment_ratio, attachment_size=attachment_size)
+
+    with FakeIMAPServer(mailbox, fetch_latency=fetch_latency) as server:
+        reader = EmailReader("bench@example.com", "password", imap_server="127.0.0.1",
+                             imap_port=server.port, use_ssl=False)
+
+        start = time.perf_counter()
+        reader.connect()
+        connect_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        raw_emails = list(reader.iter_raw_emails(days=30, limit=messages))
+        fetch_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        parsed = [reader.parse_email(message_id, raw) for message_id, raw in raw_emails]
+        parse_seconds = time.perf_counter() - start
+
+    return {
+        "emails": len(parsed),
+        "mailbox_bytes": sum(len(raw) for raw in mailbox),
+        "connect_seconds": _seconds(connect_seconds),
+        "fetch_seconds": _seconds(fetch_seconds),
+        "parse_seconds": _seconds(parse_seconds),
+        "fetch_per_second": _rate(len(raw_emails), fetch_seconds),
+        "parse_per_second": _rate(len(parsed), parse_seconds)
+    }
+
+def deadline_extractor(emails=200, llm_latency=0.05, deadline_density=1.0, seed=0) -> Dict[str, Any]:
+    """Extract deadlines one email at a time against the stub LLM."""
+    mailbox, expected = generate_mailbox(emails, seed=seed, deadline_density=deadline_density,
+                                         attachment_ratio=0.0)
+    reader = EmailReader("bench@example.com", "password")
+    email_data = [reader.parse_email(str(index), raw) for index, raw in enumerate(mailbox)]
+
+    with StubOllamaServer(latency=llm_latency) as llm:
+        extractor = DeadlineExtractor(llm_api_url=llm.url)
+        start = time.perf_counter()
+        found = sum(len(extractor.extract_deadline_records(data)) for data in email_data)
+        seconds = time.perf_counter() - start
+
+    return {
+        "emails": len(email_data),
+        "deadlines_expected": len(expected),
+        "deadlines_found": found,
+        "seconds": _seconds(seconds),
+        "emails_per_second": _rate(len(email_data), seconds),
+        # Time spent outside the simulated model
+        "overhead_ms_per_email": round((seconds - llm_latency * len(email_data)) * 1000 / max(len(email_data), 1), 3)
+    }
+
+def sync_pipeline(emails=200, llm_latency=0.05, fetch_latency=0.0, extract_workers=4, seed=0) -> Dict[str, Any]:
+    """Run the full fetch/parse/extract/store pipeline against fake servers."""
+    mailbox, expected = generate_mailbox(emails, seed=seed, deadline_density=1.0)
+    workdir = tempfile.mkdtemp(prefix="bench_pipeline_")
+    try:
+        with FakeIMAPServer(mailbox, fetch_latency=fetch_latency) as server, \
+                StubOllamaServer(latency=llm_latency) as llm:
+            reader = EmailReader("bench@example.com", "password", imap_server="127.0.0.1",
+                                 imap_port=server.port, use_ssl=False)
+            storage = DeadlineStorage(os.path.join(workdir, "deadlines.json"), archive_after_days=None)
+            pipeline = SyncPipeline(reader, DeadlineExtractor(llm_api_url=llm.url), storage,
+                                    extract_workers=extract_workers)
+
+            start = time.perf_counter()
+            results = pipeline.run(days=30, limit=emails)
+            seconds = time.perf_counter() - start
+
+        return {
+            "emails": results["processed_emails"],
+            "deadlines_expected": len(expected),
+            "deadlines_added": len(results["added_deadlines"]),
+            "deadlines_merged": results["merged_deadlines"],
+            "seconds": _seconds(seconds),
+            "emails_per_second": _rate(results["processed_emails"], seconds),
+            "stages": pipeline.get_stage_metrics()
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def _storage_size(size: int, workdir: str, upsert_batch: int, page_size: int,
+                  measure_memory: bool, seed: int) -> Dict[str, Any]:
+    path = os.path.join(workdir, f"deadlines_{size}.json")
+    records = [Deadline.from_dict(d) for d in generate_deadline_dicts(size, seed=seed)]
+
+    start = time.perf_counter()
+    with open(path, 'w') as f:
+        f.write(encode_store(records, version=1, change_horizon=0, tombstones=[]))
+    write_seconds = time.perf_counter() - start
+    ids = [record.id for record in records[::max(1, size // 1000)]]
+    del records
+    gc.collect()
+
+    result = {"records": size, "file_bytes": os.path.getsize(path), "encode_write_seconds": _seconds(write_seconds)}
+
+    if measure_memory:
+        gc.collect()
+        tracemalloc.start()
+        storage = DeadlineStorage(path, archive_after_days=None)
+        storage.get_all_records()
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        result["memory_bytes_per_record"] = round(current / size, 1)
+        del storage
+        gc.collect()
+
+    storage = DeadlineStorage(path, archive_after_days=None)
+    start = time.perf_counter()
+    storage.get_all_records()
+    result["cold_load_seconds"] = _seconds(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    storage.get_all_records()
+    result["warm_load_seconds"] = _seconds(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for deadline_id in ids:
+        storage.get_record(deadline_id)
+    result["get_record_us"] = round((time.perf_counter() - start) * 1e6 / len(ids), 3)
+
+    start = time.perf_counter()
+    storage.query_records(limit=page_size)
+    result["first_page_seconds"] = _seconds(time.perf_counter() - start)
+
+    now = datetime.datetime.now()
+    start = time.perf_counter()
+    storage.query_records(start=now + datetime.timedelta(days=7), end=now + datetime.timedelta(days=14),
+                          confidences=["high"], limit=page_size)
+    result["filtered_page_seconds"] = _seconds(time.perf_counter() - start)
+
+    version = storage.get_version()
+    batch = generate_deadline_dicts(upsert_batch, seed=seed + 1, start=size)
+    for deadline in batch:
+        deadline.pop("id")
+    start = time.perf_counter()
+    storage.upsert_deadlines(batch)
+    result["upsert_seconds"] = _seconds(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    storage.get_changes(since=version)
+    result["changes_seconds"] = _seconds(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    storage.get_upcoming_records(hours_ahead=24)
+    result["upcoming_seconds"] = _seconds(time.perf_counter() - start)
+
+    os.remove(path)
+    return result
+
+def deadline_storage(sizes=(10000, 100000, 1000000), upsert_batch=5, page_size=100,
+                     memory_limit=100000, seed=0) -> Dict[str, Any]:
+    """Load, query and write stores of increasing size.
+
+    Memory per record is measured with tracemalloc for stores of up to
+    memory_limit records; beyond that tracing costs more than the load.
+    """
+    workdir = tempfile.mkdtemp(prefix="bench_storage_")
+    try:
+        return {"sizes": [_storage_size(size, workdir, upsert_batch, page_size,
+                                        size <= memory_limit, seed)
+                          for size in sizes]}
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def notification_engine(deadlines=10000, immediate=200, llm_latency=0.05, replan=1000, seed=0) -> Dict[str, Any]:
+    """Plan reminders for a store and deliver the ones already due.
+
+    immediate deadlines are due within the hour, so each sends one reminder
+    at start; as many again are due in two hours, so their text is
+    generated right away in batches.
+    """
+    workdir = tempfile.mkdtemp(prefix="bench_notifications_")
+    try:
+        path = os.path.join(workdir, "deadlines.json")
+        now = datetime.datetime.now()
+        records = [Deadline.from_dict(d) for d in generate_deadline_dicts(deadlines, seed=seed)]
+        for index, record in enumerate(records[:2 * immediate]):
+            minutes = 30 if index < immediate else 120
+            record.due = now + datetime.timedelta(minutes=minutes)
+            record.deadline = record.due.isoformat()
+        with open(path, 'w') as f:
+            f.write(encode_store(records, version=1, change_horizon=0, tombstones=[]))
+
+        storage = DeadlineStorage(path, archive_after_days=None)
+        delivered = threading.Event()
+        counter = {"count": 0}
+        lock = threading.Lock()
+
+        def handler(notification):
+            with lock:
+                counter["count"] += 1
+                if counter["count"] >= immediate:
+                    delivered.set()
+
+        with StubOllamaServer(latency=llm_latency) as llm:
+            engine = NotificationEngine(storage, llm_api_url=llm.url,
+                                        notification_file=os.path.join(workdir, "notifications.json"),
+                                        notification_log=os.path.join(workdir, "notifications.log"),
+                                        dead_letter_file=os.path.join(workdir, "dead_letters.jsonl"))
+            engine.add_notification_handler(handler, name="bench", workers=4)
+
+            start = time.perf_counter()
+            engine.start()
+            start_seconds = time.perf_counter() - start
+            heap_entries = len(engine._heap)
+
+            delivered.wait(timeout=60)
+            deliver_seconds = time.perf_counter() - start
+
+            # Re-plan a slice of deadlines the way a storage write would
+            changed = [Deadline.from_dict(record.to_dict()) for record in records[2 * immediate:2 * immediate + replan]]
+            start = time.perf_counter()
+            engine._on_storage_change(changed, [])
+            replan_seconds = time.perf_counter() - start
+
+            # Give the batched text generation time to drain
+            time.sleep(engine.reminder_text.batch_wait_seconds + llm_latency * 2)
+            engine.stop()
+            llm_calls = llm.calls
+
+        return {
+            "deadlines": deadlines,
+            "heap_entries": heap_entries,
+            "start_seconds": _seconds(start_seconds),
+            "immediate_reminders": immediate,
+            "delivered": counter["count"],
+            "deliver_seconds": _seconds(deliver_seconds),
+            "replan_us_per_deadline": round(replan_seconds * 1e6 / max(len(changed), 1), 3),
+            "llm_calls": llm_calls,
+            "delivery": engine.get_delivery_metrics()
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def _date_strings(rng: random.Random, count: int) -> Dict[str, List[str]]:
+    """Distinct date strings of the kinds LLM extraction and storage produce."""
+    now = datetime.datetime.now().replace(second=0, microsecond=0)
+    relative = ["tomorrow", "tomorrow at 5pm", "next Friday", "by Monday 9am", "in 3 days",
+                "in two hours", "end of week", "EOD", "end of month", "Thursday at 14:30",
+                "day after tomorrow", "next week"]
+    kinds = {"iso": [], "human": [], "relative": [], "invalid": []}
+    for index in range(count):
+        due = now + datetime.timedelta(minutes=rng.randint(0, 180 * 24 * 60))
+        kinds["iso"].append(rng.choice((due.isoformat(), due.date().isoformat(),
+                                        due.strftime("%Y-%m-%dT%H:%M:%SZ"))))
+        kinds["human"].append(rng.choice((due.strftime("%B %d, %Y %I%p"), due.strftime("%d/%m/%Y"),
+                                          due.strftime("%a, %d %b %Y %H:%M:%S +0000"))))
+        kinds["relative"].append(rng.choice(relative))
+        kinds["invalid"].append(f"sometime soon {index}")
+    return kinds
+
+def date_parsing(parses=100000, distinct=2000, seed=0,
+                 mix=(("iso", 0.6), ("human", 0.25), ("relative", 0.1), ("invalid", 0.05))) -> Dict[str, Any]:
+    """Parse a realistic mix of date strings, with repeats, through date_utils.
+
+    The same sequence is also parsed the old way (ISO, else dateutil on
+    every call) for comparison.
+    """
+    rng = random.Random(seed)
+    kinds = _date_strings(rng, distinct)
+    names = [name for name, _ in mix]
+    weights = [weight for _, weight in mix]
+    sequence = [(kind, rng.choice(kinds[kind])) for kind in rng.choices(names, weights, k=parses)]
+    reference = datetime.datetime.now()
+
+    def old_parse(value):
+        try:
+            return datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            try:
+                return dateutil.parser.parse(value)
+            except (ValueError, OverflowError):
+                return None
+
+    result = {"parses": parses, "distinct_per_kind": distinct, "mix": dict(mix)}
+    for label, parse in (("date_utils", lambda value: date_utils.parse_date(value, reference)),
+                         ("uncached", old_parse)):
+        date_utils.clear_cache()
+        per_kind = {name: 0.0 for name in names}
+        parsed = 0
+        start = time.perf_counter()
+        for kind, value in sequence:
+            item_start = time.perf_counter()
+            if parse(value) is not None:
+                parsed += 1
+            per_kind[kind] += time.perf_counter() - item_start
+        seconds = time.perf_counter() - start
+        counts = {name: sum(1 for kind, _ in sequence if kind == name) for name in names}
+        result[label] = {
+            "seconds": _seconds(seconds),
+            "parses_per_second": _rate(parses, seconds),
+            "parsed": parsed,
+            "us_per_parse": {name: round(per_kind[name] * 1e6 / counts[name], 3) if counts[name] else None
+                             for name in names}
+        }
+        if label == "date_utils":
+            info = date_utils.cache_info()
+            result[label]["dateutil_cache"] = {"hits": info.hits, "misses": info.misses}
+    result["speedup"] = round(result["uncached"]["seconds"] / result["date_utils"]["seconds"], 2)
+    return result
+
+SCENARIOS = {
+    "email_reader": email_reader,
+    "deadline_extractor": deadline_extractor,
+    "sync_pipeline": sync_pipeline,
+    "deadline_storage": deadline_storage,
+    "notification_engine": notification_engine,
+    "date_parsing": date_parsing
+}
+
+# Smaller parameters for a quick sanity run
+QUICK = {
+    "email_reader": {"messages": 50},
+    "deadline_extractor": {"emails": 20, "llm_latency": 0.01},
+    "sync_pipeline": {"emails": 20, "llm_latency": 0.01},
+    "deadline_storage": {"sizes": (1000, 10000)},
+    "notification_engine": {"deadlines": 1000, "immediate": 20, "llm_latency": 0.01, "replan": 100},
+    "date_parsing": {"parses": 10000, "distinct": 500}
+}
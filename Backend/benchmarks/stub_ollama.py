@@ -0,0 +1,90 @@
+import re
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# What the mail generator writes, see mail_generator._deadline_sentence
+DEADLINE_PATTERN = re.compile(r"Please (.+?) by (\d{4}-\d{2}-\d{2}T\d{2}:\d{2})\.")
+REMINDER_ITEM_PATTERN = re.compile(r"^\s*(\d+)\. Task: (.*)$", re.MULTILINE)
+
+class _OllamaHandler(BaseHTTPRequestHandler):
+    """Answers /api/generate like Ollama with stream=False."""
+
+    def do_POST(self):
+        if self.path != "/api/generate":
+            self.send_error(404)
+            return
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        prompt = request.get("prompt", "")
+
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        with self.server.lock:
+            self.server.calls += 1
+
+        if "reminder notification" in prompt:
+            answer = [{"index": int(index), "subject": f"Reminder: {task}"[:80],
+                       "body": f"Don't forget: {task}."}
+                      for index, task in REMINDER_ITEM_PATTERN.findall(prompt)]
+        else:
+            answer = [{"task": task, "deadline": f"{due}:00", "details": "",
+                       "confidence": "high"}
+                      for task, due in DEADLINE_PATTERN.findall(prompt)]
+        text = json.dumps(answer)
+
+        body = json.dumps({
+            "model": request.get("model"),
+            "response": text,
+            "done": True,
+            # Rough token counts so token metrics have something to show
+            "prompt_eval_count": len(prompt) // 4,
+            "eval_count": len(text) // 4
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class StubOllamaServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0):
+        """A local stand-in for Ollama's generate API.
+
+        Extraction prompts get back the deadlines the mail generator wrote
+        into the email; reminder prompts get one text per listed task. Each
+        call sleeps latency seconds first, to simulate model time.
+        """
+        super().__init__((host, port), _OllamaHandler)
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.server_address[0]}:{self.server_address[1]}/api/generate"
+
+    def start(self):
+        """Serve in a background thread."""
+        self.thread = threading.Thread(target=self.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving and close the socket."""
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+        return False
@@ -0,0 +1,211 @@
+import re
+import datetime
+from functools import lru_cache
+from typing import Any, Optional
+import dateutil.parser
+
+# Word numbers accepted in relative expressions ("in two days")
+_NUMBERS = {
+    "a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6,
+    "seven": 7, "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12
+}
+
+_UNITS = {
+    "minute": "minutes", "minutes": "minutes", "min": "minutes", "mins": "minutes",
+    "hour": "hours", "hours": "hours", "hr": "hours", "hrs": "hours",
+    "day": "days", "days": "days",
+    "week": "weeks", "weeks": "weeks"
+}
+
+_WEEKDAYS = {
+    "monday": 0, "mon": 0, "tuesday": 1, "tue": 1, "tues": 1, "wednesday": 2, "wed": 2,
+    "thursday": 3, "thu": 3, "thurs": 3, "friday": 4, "fri": 4,
+    "saturday": 5, "sat": 5, "sunday": 6, "sun": 6
+}
+
+_END_OF_DAY = (23, 59)
+_CLOSE_OF_BUSINESS = (17, 0)
+
+# "<day> at 5pm", "<day> 17:30", "<day> by 9 am"; the day part may be empty
+_TIME_SUFFIX = re.compile(
+    r"^(?P<day>.*?)\s*(?P<keyword>\b(?:at|by)\s*|@\s*)?"
+    r"(?P<hour>\d{1,2})(?::(?P<minute>\d{2}))?\s*(?P<ampm>[ap]\.?m\.?)?$"
+)
+_OFFSET = re.compile(r"^(?:in\s+)?(?P<count>\d+|[a-z]+)\s+(?P<unit>[a-z]+)(?P<from_now>\s+from\s+now)?$")
+_WEEKDAY = re.compile(r"^(?:(?P<which>this|next|coming)\s+)?(?P<weekday>[a-z]+)$")
+_LEADING_WORDS = re.compile(r"^(?:(?:due|by|on|before)\s+)+")
+
+def to_local_naive(value: datetime.datetime) -> datetime.datetime:
+    """Convert an aware datetime to naive local time; naive ones are returned as is."""
+    if value.tzinfo is not None:
+        return value.astimezone().replace(tzinfo=None)
+    return value
+
+def parse_date(value: Any, reference: Any = None) -> Optional[datetime.datetime]:
+    """Parse a date string to a naive local datetime, or None if it is not a date.
+
+    ISO 8601 strings take a fast path. Anything else is tried as a relative
+    expression ("tomorrow at 5pm", "next Friday", "in 3 days", "end of
+    week") when a reference time is given, e.g. the date of the email the
+    deadline came from, and finally with dateutil, whose results are
+    memoized. Without a reference, relative expressions are not resolved,
+    but dateutil still fills parts a string leaves out (the day of
+    "Friday", the year of "March 20") from today, so such strings resolve
+    differently as time passes. Store the normalize_date form, which is
+    ISO 8601 and stays put.
+    """
+    if value.__class__ is str:
+        try:
+            parsed = datetime.datetime.fromisoformat(value)
+        except ValueError:
+            parsed = _parse_slow(value, reference)
+            if parsed is None:
+                return None
+    elif isinstance(value, datetime.datetime):
+        parsed = value
+    else:
+        return None
+
+    # Compare everything as naive local time
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return parsed
+
+def normalize_date(value: Any, reference: Any = None) -> Optional[str]:
+    """ISO 8601 form of a date string (see parse_date), or None if it is not a date."""
+    parsed = parse_date(value, reference)
+    return parsed.isoformat() if parsed else None
+
+def resolve_relative(text: str, reference: datetime.datetime) -> Optional[datetime.datetime]:
+    """Resolve a relative date expression against a naive reference time.
+
+    Returns None if text is not a relative expression this module knows.
+    A day without a time resolves to midnight, like an ISO date.
+    """
+    text = _LEADING_WORDS.sub("", text.strip().lower().rstrip(".,;!"))
+    if not text:
+        return None
+
+    # Minute and hour offsets keep the reference's time of day; day and week
+    # offsets land at midnight, like a bare date
+    match = _OFFSET.match(text)
+    if match and (match.group("count").isdigit() or match.group("count") in _NUMBERS):
+        unit = _UNITS.get(match.group("unit"))
+        if unit and (text.startswith("in ") or match.group("from_now")):
+            count = int(match.group("count")) if match.group("count").isdigit() else _NUMBERS[match.group("count")]
+            offset = reference + datetime.timedelta(**{unit: count})
+            return offset if unit in ("minutes", "hours") else _at(offset, None)
+
+    time_of_day = None
+    match = _TIME_SUFFIX.match(text)
+    if match and (match.group("keyword") or match.group("minute") or match.group("ampm")):
+        time_of_day = _time_of_day(match)
+        if time_of_day is None:
+            return None
+        text = match.group("day").strip()
+    elif text.endswith(" noon") or text == "noon":
+        time_of_day = (12, 0)
+        text = text[:-len("noon")].strip()
+    text = re.sub(r"\s+(?:at|by)$", "", text)
+
+    day = _resolve_day(text, reference)
+    if day is None:
+        return None
+    date, default_time = day
+    return _at(date, time_of_day or default_time)
+
+def _resolve_day(text: str, reference: datetime.datetime):
+    """(date, default time of day) for a relative day phrase, or None."""
+    text = re.sub(r"\bthe\s+", "", text)
+
+    if text in ("", "today"):
+        return reference, None
+    if text in ("tonight", "eod", "end of day", "by end of day"):
+        return reference, _END_OF_DAY
+    if text in ("cob", "close of business"):
+        return reference, _CLOSE_OF_BUSINESS
+    if text == "tomorrow":
+        return reference + datetime.timedelta(days=1), None
+    if text in ("tomorrow night", "tomorrow eod", "end of day tomorrow"):
+        return reference + datetime.timedelta(days=1), _END_OF_DAY
+    if text == "day after tomorrow":
+        return reference + datetime.timedelta(days=2), None
+    if text == "next week":
+        return reference + datetime.timedelta(weeks=1), None
+    if text in ("end of week", "eow", "end of this week"):
+        return reference + datetime.timedelta(days=(4 - reference.weekday()) % 7), _END_OF_DAY
+    if text in ("end of month", "eom", "end of this month"):
+        first_of_next = (reference.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+        return first_of_next - datetime.timedelta(days=1), _END_OF_DAY
+
+    match = _WEEKDAY.match(text)
+    if match and match.group("weekday") in _WEEKDAYS:
+        days_ahead = (_WEEKDAYS[match.group("weekday")] - reference.weekday()) % 7
+        if match.group("which") in ("next", "coming") and days_ahead == 0:
+            days_ahead = 7
+        return reference + datetime.timedelta(days=days_ahead), None
+
+    return None
+
+def _time_of_day(match) -> Optional[tuple]:
+    hour = int(match.group("hour"))
+    minute = int(match.group("minute") or 0)
+    ampm = (match.group("ampm") or "").replace(".", "")
+    if ampm:
+        if not 1 <= hour <= 12:
+            return None
+        hour = hour % 12 + (12 if ampm == "pm" else 0)
+    if hour > 23 or minute > 59:
+        return None
+    return hour, minute
+
+def _at(date: datetime.datetime, time_of_day: Optional[tuple]) -> datetime.datetime:
+    hour, minute = time_of_day or (0, 0)
+    return date.replace(hour=hour, minute=minute, second=0, microsecond=0)
+
+def _as_reference(reference: Any) -> Optional[datetime.datetime]:
+    """Turn a reference time (datetime or date string) into naive local time."""
+    if isinstance(reference, str):
+        reference = parse_date(reference)
+    if isinstance(reference, datetime.datetime):
+        return to_local_naive(reference)
+    return None
+
+def _parse_slow(value: str, reference: Any) -> Optional[datetime.datetime]:
+    """Everything that is not plain ISO 8601."""
+    text = value.strip()
+    if not text:
+        return None
+
+    # Older Pythons' fromisoformat does not take a Z suffix
+    if text.endswith(("Z", "z")):
+        try:
+            return datetime.datetime.fromisoformat(text[:-1] + "+00:00")
+        except ValueError:
+            pass
+
+    reference = _as_reference(reference)
+    if reference is not None:
+        resolved = resolve_relative(text, reference)
+        if resolved is not None:
+            return resolved
+
+    # Missing parts (e.g. the year) come from the reference day, which is
+    # part of the cache key so cached results never go stale
+    default = (reference or datetime.datetime.now()).replace(hour=0, minute=0, second=0, microsecond=0)
+    return _parse_with_dateutil(text, default)
+
+@lru_cache(maxsize=4096)
+def _parse_with_dateutil(text: str, default: datetime.datetime) -> Optional[datetime.datetime]:
+    try:
+        return dateutil.parser.parse(text, default=default)
+    except (ValueError, OverflowError, TypeError):
+        return None
+
+def clear_cache():
+    """Forget memoized dateutil results."""
+    _parse_with_dateutil.cache_clear()
+
+def cache_info():
+    """Hit/miss statistics of the memoized dateutil parser."""
+    return _parse_with_dateutil.cache_info()
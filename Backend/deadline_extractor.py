@@ -4,6 +4,9 @@ import os
 import re
 import datetime
 from typing import List, Dict, Any, Optional
+from deadline_record import Deadline
+from date_utils import normalize_date
+import metrics
 
 class DeadlineExtractor:
     def __init__(self, llm_api_url="http://localhost:11434/api/generate"):
@@ -13,17 +16,25 @@ class DeadlineExtractor:
     
     def extract_deadlines(self, email_data: Dict[str, Any]) -> List[Dict[str, Any]]:
         """Extract deadlines from email content using LLM."""
-        prompt = self._create_extraction_prompt(email_data)
-        llm_response = self._query_llm(prompt)
-        
-        if not llm_response:
-            return []
-        
-        # Extract the JSON part from the response
-        deadlines = self._parse_llm_response(llm_response)
-        
-        # Add metadata and normalize dates
-        return self._process_deadlines(deadlines, email_data)
+        return [record.to_dict() for record in self.extract_deadline_records(email_data)]
+    
+    def extract_deadline_records(self, email_data: Dict[str, Any]) -> List[Deadline]:
+        """Extract deadlines from email content as Deadline records."""
+        with metrics.tracer.span("extract", trace_id=email_data.get('id')) as span:
+            prompt = self._create_extraction_prompt(email_data)
+            span.set(prompt_chars=len(prompt))
+            llm_response = self._query_llm(prompt)
+            
+            if not llm_response:
+                return []
+            
+            # Extract the JSON part from the response
+            deadlines = self._parse_llm_response(llm_response)
+            
+            # Add metadata and normalize dates
+            records = self._process_deadlines(deadlines, email_data)
+            span.set(deadlines=len(records))
+            return records
     
     def _create_extraction_prompt(self, email_data: Dict[str, Any]) -> str:
         """Create a prompt for the LLM to extract deadlines."""
@@ -55,24 +66,30 @@ class DeadlineExtractor:
     
     def _query_llm(self, prompt: str) -> Optional[str]:
         """Send a prompt to the LLM API and get the response."""
+        metrics.LLM_PROMPT_CHARS.observe(len(prompt), purpose="extract")
         try:
-            response = requests.post(
-                self.llm_api_url,
-                json={
-                    "model": self.model_name,
-                    "prompt": prompt,
-                    "stream": False
-                },
-                timeout=30
-            )
+            with metrics.LLM_REQUEST_SECONDS.time(purpose="extract"):
+                response = requests.post(
+                    self.llm_api_url,
+                    json={
+                        "model": self.model_name,
+                        "prompt": prompt,
+                        "stream": False
+                    },
+                    timeout=30
+                )
             
             if response.status_code == 200:
-                return response.json().get("response", "")
+                result = response.json()
+                metrics.record_llm_usage("extract", result)
+                return result.get("response", "")
             else:
                 print(f"API error: {response.status_code}")
+                metrics.LLM_ERRORS.inc(purpose="extract")
                 return None
         except Exception as e:
             print(f"LLM query error: {e}")
+            metrics.LLM_ERRORS.inc(purpose="extract")
             return None
     
     def _parse_llm_response(self, response: str) -> List[Dict[str, Any]]:
@@ -84,16 +101,24 @@ class DeadlineExtractor:
                 json_str = json_match.group(0)
                 deadlines = json.loads(json_str)
                 return deadlines if isinstance(deadlines, list) else []
+            metrics.LLM_PARSE_FAILURES.inc(purpose="extract")
             return []
         except json.JSONDecodeError:
             print("Failed to parse LLM response as JSON")
+            metrics.LLM_PARSE_FAILURES.inc(purpose="extract")
             return []
     
-    def _process_deadlines(self, deadlines: List[Dict[str, Any]], email_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    def _process_deadlines(self, deadlines: List[Dict[str, Any]], email_data: Dict[str, Any]) -> List[Deadline]:
         """Process and normalize extracted deadlines."""
         processed = []
         
+        # Relative dates ("next Friday") are relative to when the email was sent
+        reference = email_data.get("date") or datetime.datetime.now()
+        
         for deadline in deadlines:
+            if not isinstance(deadline, dict):
+                continue
+            
             # Try to normalize the date format
             deadline_date = None
             date_str = deadline.get("deadline", "")
@@ -101,44 +126,31 @@ class DeadlineExtractor:
             if date_str:
                 try:
                     # Handle various date formats
-                    deadline_date = self._normalize_date(date_str)
+                    deadline_date = self._normalize_date(date_str, reference)
                 except:
                     # Keep original if parsing fails
                     deadline_date = date_str
             
             # Add metadata
-            processed_deadline = {
-                "task": deadline.get("task", "Unknown task"),
-                "deadline": deadline_date,
-                "details": deadline.get("details", ""),
-                "confidence": deadline.get("confidence", "medium"),
-                "source_email_id": email_data.get("id", ""),
-                "source_email_subject": email_data.get("subject", ""),
-                "source_email_from": email_data.get("from", ""),
-                "extraction_time": datetime.datetime.now().isoformat()
-            }
+            processed_deadline = Deadline(
+                task=deadline.get("task", "Unknown task"),
+                deadline=deadline_date,
+                details=deadline.get("details", ""),
+                confidence=deadline.get("confidence", "medium"),
+                source_email_id=email_data.get("id", ""),
+                source_email_subject=email_data.get("subject", ""),
+                source_email_from=email_data.get("from", ""),
+                extraction_time=datetime.datetime.now().isoformat()
+            )
             
             processed.append(processed_deadline)
         
         return processed
     
-    def _normalize_date(self, date_str: str) -> str:
-        """Attempt to normalize date to ISO format."""
-        # Try direct parsing first
-        try:
-            parsed_date = datetime.datetime.fromisoformat(date_str.replace('Z', '+00:00'))
-            return parsed_date.isoformat()
-        except ValueError:
-            pass
-        
-        # Use dateutil for more flexible parsing
-        try:
-            import dateutil.parser
-            parsed_date = dateutil.parser.parse(date_str)
-            return parsed_date.isoformat()
-        except:
-            # Return original if all parsing fails
-            return date_str
+    def _normalize_date(self, date_str: str, reference=None) -> str:
+        """Attempt to normalize date to ISO format, resolving relative dates against reference."""
+        # Return original if parsing fails
+        return normalize_date(date_str, reference or datetime.datetime.now()) or date_str
 
 # Usage example
 if __name__ == "__main__":
@@ -0,0 +1,189 @@
+import sys
+import json
+import datetime
+from enum import Enum
+from typing import List, Dict, Any, Optional, Iterable, Tuple
+from date_utils import parse_date
+
+class Confidence(str, Enum):
+    """Confidence level that an extracted item is really a deadline."""
+    HIGH = "high"
+    MEDIUM = "medium"
+    LOW = "low"
+
+    @classmethod
+    def coerce(cls, value: Any) -> "Confidence":
+        """Map a raw confidence value onto the enum, defaulting to medium."""
+        if isinstance(value, cls):
+            return value
+        return _CONFIDENCE_LOOKUP.get(str(value).strip().lower(), cls.MEDIUM)
+
+_CONFIDENCE_LOOKUP = {member.value: member for member in Confidence}
+
+def parse_deadline_date(date_str: Optional[str]) -> Optional[datetime.datetime]:
+    """Parse a stored deadline string to a naive local datetime.
+
+    Stored dates are absolute, so relative expressions are not resolved here.
+    """
+    if not isinstance(date_str, str):
+        return None
+    return parse_date(date_str)
+
+class Deadline:
+    """A stored deadline with its date parsed once, at construction."""
+
+    __slots__ = (
+        "id", "task", "deadline", "due", "details", "confidence",
+        "source_email_id", "source_email_subject", "source_email_from",
+        "extraction_time", "seq", "extra"
+    )
+
+    # Serialized fields, in output order ("due" is derived from "deadline")
+    FIELDS = (
+        "id", "task", "deadline", "details", "confidence",
+        "source_email_id", "source_email_subject", "source_email_from",
+        "extraction_time", "seq"
+    )
+
+    def __init__(self, task: str, deadline: Optional[str], details: Optional[str] = None,
+                 confidence: Any = Confidence.MEDIUM, id: Optional[str] = None,
+                 source_email_id: Optional[str] = None, source_email_subject: Optional[str] = None,
+                 source_email_from: Optional[str] = None, extraction_time: Optional[str] = None,
+                 seq: Optional[int] = None, extra: Optional[Dict[str, Any]] = None):
+        self.id = id
+        self.task = task
+        self.deadline = deadline
+        self.due = parse_deadline_date(deadline)
+        self.details = details
+        self.confidence = Confidence.coerce(confidence)
+        self.source_email_id = source_email_id
+        self.source_email_subject = source_email_subject
+        # Senders repeat across many records, so share one string per sender
+        self.source_email_from = sys.intern(source_email_from) if isinstance(source_email_from, str) else source_email_from
+        self.extraction_time = extraction_time
+        self.seq = seq  # Storage change sequence of the last write to this record
+        self.extra = extra
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Deadline":
+        """Build a record from a deadline dict, keeping unknown keys in extra."""
+        # Bypass __init__ keyword handling, this runs once per stored record
+        record = cls.__new__(cls)
+        get = data.get
+        record.id = get("id")
+        record.task = get("task")
+        record.deadline = get("deadline")
+        record.due = parse_deadline_date(record.deadline)
+        record.details = get("details")
+        record.confidence = Confidence.coerce(get("confidence", Confidence.MEDIUM))
+        record.source_email_id = get("source_email_id")
+        record.source_email_subject = get("source_email_subject")
+        sender = get("source_email_from")
+        record.source_email_from = sys.intern(sender) if isinstance(sender, str) else sender
+        record.extraction_time = get("extraction_time")
+        record.seq = get("seq")
+        record.extra = None
+        if not _FIELD_SET.issuperset(data):
+            record.extra = {k: v for k, v in data.items() if k not in _FIELD_SET}
+        return record
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert to a plain dict, leaving out optional fields that are unset."""
+        data = {"id": self.id, "task": self.task, "deadline": self.deadline}
+        if self.id is None:
+            del data["id"]
+        if self.details is not None:
+            data["details"] = self.details
+        data["confidence"] = self.confidence.value
+        if self.source_email_id is not None:
+            data["source_email_id"] = self.source_email_id
+        if self.source_email_subject is not None:
+            data["source_email_subject"] = self.source_email_subject
+        if self.source_email_from is not None:
+            data["source_email_from"] = self.source_email_from
+        if self.extraction_time is not None:
+            data["extraction_time"] = self.extraction_time
+        if self.seq is not None:
+            data["seq"] = self.seq
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+    def __repr__(self):
+        return f"Deadline(id={self.id!r}, task={self.task!r}, deadline={self.deadline!r})"
+
+_FIELD_SET = frozenset(Deadline.FIELDS)
+
+def encode_deadlines(records: Iterable[Deadline]) -> str:
+    """Serialize records to a compact JSON array."""
+    return json.dumps([record.to_dict() for record in records], separators=(',', ':'))
+
+def decode_deadlines(text: str) -> List[Deadline]:
+    """Parse a JSON array of deadline dicts into records, skipping non-objects."""
+    from_dict = Deadline.from_dict
+    return [from_dict(item) for item in json.loads(text) if isinstance(item, dict)]
+
+def encode_store(records: Iterable[Deadline], **meta) -> str:
+    """Serialize records and store metadata (e.g. version) for the storage file."""
+    data = dict(meta)
+    data["deadlines"] = [record.to_dict() for record in records]
+    return json.dumps(data, separators=(',', ':'))
+
+def decode_store(text: str) -> Tuple[List[Deadline], Dict[str, Any]]:
+    """Parse a storage file into (records, metadata).
+
+    Plain JSON arrays written by older versions are read with empty metadata.
+    """
+    data = json.loads(text)
+    if isinstance(data, list):
+        items, meta = data, {}
+    else:
+        items = data.pop("deadlines", [])
+        meta = data
+    from_dict = Deadline.from_dict
+    return [from_dict(item) for item in items if isinstance(item, dict)], meta
+
+# Usage example: compare memory, load time and scan time against plain dicts
+if __name__ == "__main__":
+    import time
+    import tracemalloc
+
+    count = 100000
+    sample = [{
+        "id": f"dl_20250101000000_{i:08x}",
+        "task": f"Submit report {i}",
+        "deadline": f"2025-{i % 12 + 1:02d}-{i % 28 + 1:02d}T17:00:00",
+        "details": "Final version with all appendices",
+        "confidence": ("high", "medium", "low")[i % 3],
+        "source_email_id": str(i),
+        "source_email_subject": "Project deadline reminder",
+        "source_email_from": "manager@example.com",
+        "extraction_time": "2025-01-01T00:00:00"
+    } for i in range(count)]
+    text = json.dumps(sample)
+    del sample
+    cutoff = datetime.datetime(2025, 6, 1)
+
+    for label, loader, scan in (
+        ("dict", lambda: json.loads(text),
+         lambda items: [d for d in items if (parse_deadline_date(d["deadline"]) or cutoff) < cutoff]),
+        ("Deadline", lambda: decode_deadlines(text),
+         lambda items: [r for r in items if r.due and r.due < cutoff])
+    ):
+        start = time.perf_counter()
+        loaded = loader()
+        load_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        scan(loaded)
+        scan_time = time.perf_counter() - start
+        del loaded
+
+        tracemalloc.start()
+        loaded = loader()
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del loaded
+
+        print(f"{label:>8}: load {load_time * 1000:.0f} ms, scan {scan_time * 1000:.0f} ms, "
+              f"{current / count:.0f} bytes/record")
@@ -1,161 +1,676 @@
 import json
 import os
+import re
+import base64
+import bisect
+import hashlib
+import gzip
+import time
 import datetime
-from typing import List, Dict, Any, Optional
+import tempfile
+import uuid
+from typing import List, Dict, Any, Optional, Union, Tuple, Callable
 import threading
+from collections import OrderedDict
+from deadline_record import Deadline, Confidence, decode_store, encode_store, parse_deadline_date
+from file_lock import FileLock
+import metrics
 
 class DeadlineStorage:
-    def __init__(self, storage_file="deadlines.json"):
-        """Initialize storage with the path to the storage file."""
+    def __init__(self, storage_file="deadlines.json", archive_dir=None,
+                 archive_after_days=30, archive_check_interval=3600,
+                 max_tombstones=10000, create_file=True):
+        """Initialize storage with the path to the storage file.
+        
+        Deadlines that passed more than archive_after_days ago are moved out
+        of the storage file into gzip-compressed monthly partitions under
+        archive_dir (set archive_after_days to None to disable archival).
+        
+        Deletions are remembered as tombstones for get_changes; only the most
+        recent max_tombstones are kept.
+        
+        Several processes may share the file: every read-modify-write holds an
+        exclusive lock on storage_file + ".lock", and refresh() picks up
+        changes made by other processes.
+        
+        With create_file False a missing storage file reads as empty and is
+        only created by the first write.
+        """
         self.storage_file = storage_file
         self.lock = threading.Lock()  # For thread safety
+        self._file_lock = FileLock(storage_file + ".lock")  # For process safety, taken after self.lock
+        
+        # Cold archive of past deadlines
+        if archive_dir is None:
+            archive_dir = os.path.splitext(storage_file)[0] + "_archive"
+        self.archive_dir = archive_dir
+        self.archive_after_days = archive_after_days
+        self.archive_check_interval = archive_check_interval
+        self._last_archive_check = 0.0
+        
+        # Parsed records, reused until the file changes on disk
+        self._records = None
+        self._positions = {}  # Deadline ID -> index in self._records
+        self._stamp = None
+        self._version = 0  # Bumped on every save, persisted in the file
+        
+        # Change feed: every save stamps the records it wrote with the new
+        # version and leaves a tombstone for each record it removed
+        self.max_tombstones = max_tombstones
+        self._tombstones = []
+        self._change_horizon = 0  # Changes at or before this version were pruned
+        self._by_seq = []
+        self._seqs = []
+        self._change_listeners = []
+        
+        # Batches waiting to be group-committed by upsert_deadlines
+        self._pending_lock = threading.Lock()
+        self._pending_batches = []
         
         # Create storage file if it doesn't exist
-        if not os.path.exists(storage_file):
+        if create_file and not os.path.exists(storage_file):
             with open(storage_file, 'w') as f:
                 json.dump([], f)
     
     def get_all_deadlines(self) -> List[Dict[str, Any]]:
         """Get all stored deadlines."""
+        return [record.to_dict() for record in self.get_all_records()]
+    
+    def get_all_records(self) -> List[Deadline]:
+        """Get all stored deadlines as Deadline records.
+        
+        Records are shared with the storage cache and must not be modified.
+        """
         with self.lock:
-            try:
-                with open(self.storage_file, 'r') as f:
-                    return json.load(f)
-            except Exception as e:
-                print(f"Error reading deadlines: {e}")
-                return []
+            return list(self._load_records())
     
     def add_deadline(self, deadline: Dict[str, Any]) -> bool:
         """Add a new deadline to storage."""
-        if not self._is_valid_deadline(deadline):
-            return False
-        
-        # Check if this is a duplicate
-        if self._is_duplicate(deadline):
-            return False
-        
-        # Add unique ID if not present
-        if 'id' not in deadline:
-            deadline['id'] = f"dl_{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}_{id(deadline)}"
-        
-        # Add to storage
-        with self.lock:
-            deadlines = self.get_all_deadlines()
-            deadlines.append(deadline)
-            return self._save_deadlines(deadlines)
+        result = self.upsert_deadlines([deadline])
+        return len(result["added"]) > 0
     
     def add_multiple_deadlines(self, deadlines: List[Dict[str, Any]]) -> int:
         """Add multiple deadlines, returns count of added items."""
         if not deadlines:
             return 0
         
-        count = 0
-        current_deadlines = self.get_all_deadlines()
+        result = self.upsert_deadlines(deadlines)
+        return len(result["added"])
+    
+    def upsert_deadlines(self, deadlines: List[Union[Dict[str, Any], Deadline]]) -> Dict[str, List[Dict[str, Any]]]:
+        """Validate, deduplicate and atomically commit a batch of deadlines.
+        
+        Batches submitted concurrently are group-committed: whichever caller
+        gets the lock first applies every pending batch with a single read and
+        a single write, and the other callers just pick up their results.
         
-        for deadline in deadlines:
-            if not self._is_valid_deadline(deadline):
-                continue
-                
-            # Check for duplicates
-            if any(self._are_similar_deadlines(deadline, existing) for existing in current_deadlines):
-                continue
+        Returns a dict with the "added", "merged" and "rejected" records of
+        this call. Merged records are the stored versions after merging.
+        If the commit fails, every record of the call is rejected and the
+        dict also has an "error".
+        """
+        batch = {
+            "deadlines": list(deadlines or []),
+            "result": None,
+            "done": threading.Event()
+        }
+        
+        with self._pending_lock:
+            self._pending_batches.append(batch)
+        
+        with self.lock, self._file_lock:
+            # Another caller may already have committed our batch
+            if not batch["done"].is_set():
+                with self._pending_lock:
+                    batches = self._pending_batches
+                    self._pending_batches = []
+                self._commit_batches(batches)
+        
+        batch["done"].wait()
+        return batch["result"]
+    
+    def add_change_listener(self, listener: Callable[[List[Deadline], List[str]], None]):
+        """Register a callback for saved changes.
+        
+        It is called as listener(changed_records, removed_ids) after every
+        save by this instance, while the storage lock is held, so it must be
+        quick and must not call back into storage.
+        """
+        self._change_listeners.append(listener)
+    
+    def refresh(self) -> bool:
+        """Pick up changes other processes made to the storage file.
+        
+        If the file changed since it was last read here, it is reloaded and
+        change listeners are told which records changed or disappeared, as
+        if the save had happened in this process. Returns True if it reloaded.
+        """
+        with self.lock:
+            if self._records is not None and self._file_stamp() == self._stamp:
+                return False
+            
+            previous = {record.id: record.seq for record in self._records or []}
+            records = self._load_records(auto_archive=False)
             
-            # Add unique ID
-            deadline['id'] = f"dl_{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}_{id(deadline)}"
-            current_deadlines.append(deadline)
-            count += 1
+            # Every save stamps the records it writes, so seq tells what changed
+            changed = [record for record in records
+                       if record.id not in previous or previous[record.id] != record.seq]
+            kept_ids = {record.id for record in records}
+            removed_ids = [deadline_id for deadline_id in previous
+                           if deadline_id and deadline_id not in kept_ids]
+            if changed or removed_ids:
+                self._notify_listeners(changed, removed_ids)
+            return True
+    
+    def get_version(self) -> int:
+        """Get the storage version, which changes whenever the stored deadlines do."""
+        with self.lock:
+            self._load_records()
+            return self._version
+    
+    def get_record(self, deadline_id: str) -> Optional[Deadline]:
+        """Look up a single record by ID."""
+        with self.lock:
+            records = self._load_records()
+            position = self._positions.get(deadline_id)
+            return records[position] if position is not None else None
+    
+    def get_deadline(self, deadline_id: str) -> Optional[Dict[str, Any]]:
+        """Look up a single deadline by ID."""
+        record = self.get_record(deadline_id)
+        return record.to_dict() if record else None
+    
+    def query_records(self, start: Optional[datetime.datetime] = None,
+                      end: Optional[datetime.datetime] = None,
+                      confidences: Optional[List[str]] = None,
+                      sender: Optional[str] = None,
+                      cursor: Optional[str] = None,
+                      limit: Optional[int] = None) -> Tuple[List[Deadline], Optional[str]]:
+        """Get one page of records matching the filters, in storage order.
         
-        if count > 0:
-            with self.lock:
-                self._save_deadlines(current_deadlines)
+        start/end bound the deadline date, confidences is a list of accepted
+        confidence levels and sender matches part of the source email sender.
+        Returns (records, next_cursor); next_cursor is None on the last page.
+        """
+        wanted_confidences = None
+        if confidences:
+            wanted_confidences = {Confidence.coerce(c) for c in confidences}
+        sender = sender.lower() if sender else None
         
-        return count
+        with self.lock:
+            records = self._load_records()
+            position = self._decode_cursor(cursor)
+            page = []
+            
+            while position < len(records):
+                record = records[position]
+                position += 1
+                
+                if start and (not record.due or record.due < start):
+                    continue
+                if end and (not record.due or record.due > end):
+                    continue
+                if wanted_confidences and record.confidence not in wanted_confidences:
+                    continue
+                if sender and sender not in (record.source_email_from or "").lower():
+                    continue
+                
+                page.append(record)
+                if limit and len(page) >= limit:
+                    break
+            
+            # Only hand out a cursor if there is anything left to scan
+            next_cursor = None
+            if limit and len(page) >= limit and position < len(records):
+                next_cursor = self._encode_cursor(position, page[-1].id)
+            
+            return page, next_cursor
+    
+    def get_changes(self, since: int = 0) -> Dict[str, Any]:
+        """Get what changed after the change cursor since.
+        
+        Returns {"cursor", "reset", "upserted", "deleted"}. Pass the returned
+        cursor on the next call. With since=0, or when since is too old for
+        the remaining tombstones, reset is True and upserted holds every
+        record, so the client should replace its copy.
+        """
+        with self.lock:
+            self._load_records()
+            reset = since <= 0 or since < self._change_horizon or since > self._version
+            
+            if reset:
+                upserted = list(self._records or [])
+                deleted = []
+            else:
+                start = bisect.bisect_right(self._seqs, since)
+                upserted = self._by_seq[start:]
+                deleted = [{"id": t["id"], "reason": t.get("reason", "deleted")}
+                           for t in self._tombstones if t["seq"] > since]
+            
+            return {
+                "cursor": self._version,
+                "reset": reset,
+                "upserted": upserted,
+                "deleted": deleted
+            }
     
     def update_deadline(self, deadline_id: str, updated_data: Dict[str, Any]) -> bool:
         """Update an existing deadline by ID."""
-        with self.lock:
-            deadlines = self.get_all_deadlines()
+        if not os.path.exists(self.storage_file):
+            return False
+        with self.lock, self._file_lock:
+            records = list(self._load_records())
             
-            for i, deadline in enumerate(deadlines):
-                if deadline.get('id') == deadline_id:
+            for i, record in enumerate(records):
+                if record.id == deadline_id:
                     # Preserve ID and source info
                     updated_data['id'] = deadline_id
-                    if 'source_email_id' in deadline:
-                        updated_data['source_email_id'] = deadline['source_email_id']
-                    if 'source_email_subject' in deadline:
-                        updated_data['source_email_subject'] = deadline['source_email_subject']
+                    if record.source_email_id is not None:
+                        updated_data['source_email_id'] = record.source_email_id
+                    if record.source_email_subject is not None:
+                        updated_data['source_email_subject'] = record.source_email_subject
                     
-                    deadlines[i] = updated_data
-                    return self._save_deadlines(deadlines)
+                    records[i] = Deadline.from_dict(updated_data)
+                    return self._save_records(records)
             
             return False
     
     def delete_deadline(self, deadline_id: str) -> bool:
         """Delete a deadline by ID."""
-        with self.lock:
-            deadlines = self.get_all_deadlines()
-            initial_count = len(deadlines)
-            
-            deadlines = [d for d in deadlines if d.get('id') != deadline_id]
+        if not os.path.exists(self.storage_file):
+            return False
+        with self.lock, self._file_lock:
+            records = self._load_records()
+            remaining = [r for r in records if r.id != deadline_id]
             
-            if len(deadlines) < initial_count:
-                return self._save_deadlines(deadlines)
+            if len(remaining) < len(records):
+                return self._save_records(remaining)
             return False
     
     def get_upcoming_deadlines(self, hours_ahead=24) -> List[Dict[str, Any]]:
         """Get deadlines coming up within specified hours."""
-        all_deadlines = self.get_all_deadlines()
-        upcoming = []
-        
+        return [record.to_dict() for record in self.get_upcoming_records(hours_ahead)]
+    
+    def get_upcoming_records(self, hours_ahead=24) -> List[Deadline]:
+        """Get Deadline records coming up within specified hours."""
         now = datetime.datetime.now()
         cutoff = now + datetime.timedelta(hours=hours_ahead)
         
-        for deadline in all_deadlines:
-            deadline_date = self._parse_deadline_date(deadline.get('deadline'))
+        return [record for record in self.get_all_records()
+                if record.due and now <= record.due <= cutoff]
+    
+    def archive_expired_deadlines(self, max_age_days: Optional[float] = None) -> int:
+        """Move deadlines older than max_age_days into the archive, returns count moved."""
+        with self.lock, self._file_lock:
+            records = self._load_records(auto_archive=False)
+            remaining = self._archive_expired(records, max_age_days)
+            return len(records) - len(remaining)
+    
+    def get_archived_deadlines(self, start: Optional[datetime.datetime] = None,
+                               end: Optional[datetime.datetime] = None) -> List[Dict[str, Any]]:
+        """Get archived deadlines, optionally limited to a date range.
+        
+        Only the monthly partitions overlapping [start, end] are opened.
+        """
+        archived = []
+        seen_ids = set()
+        
+        for month, path in self._archive_partitions():
+            if start and month < (start.year, start.month):
+                continue
+            if end and month > (end.year, end.month):
+                continue
             
-            if deadline_date and now <= deadline_date <= cutoff:
-                upcoming.append(deadline)
+            for deadline in self._read_archive_partition(path):
+                # A crash between archiving and saving can leave a record in
+                # the archive twice, so skip repeats
+                deadline_id = deadline.get('id')
+                if deadline_id is not None and deadline_id in seen_ids:
+                    continue
+                
+                deadline_date = parse_deadline_date(deadline.get('deadline'))
+                if start and (not deadline_date or deadline_date < start):
+                    continue
+                if end and (not deadline_date or deadline_date > end):
+                    continue
+                
+                seen_ids.add(deadline_id)
+                archived.append(deadline)
         
-        return upcoming
+        return archived
+    
+    def _load_records(self, auto_archive: bool = True) -> List[Deadline]:
+        """Read records from the storage file, reusing the cache if the file is unchanged.
+        
+        Caller must hold the lock and must not modify the returned list.
+        """
+        stamp = self._file_stamp()
+        if stamp is None and not os.path.exists(self.storage_file):
+            # Not written yet, see create_file
+            if self._records is None or self._stamp is not None:
+                self._set_cache([], 0, [], 0)
+                self._stamp = None
+            return self._records
+        if stamp is None or stamp != self._stamp or self._records is None:
+            try:
+                with metrics.STORAGE_READ_SECONDS.time():
+                    with open(self.storage_file, 'r') as f:
+                        records, meta = decode_store(f.read())
+                self._set_cache(records, meta.get("version", 0),
+                                meta.get("tombstones", []), meta.get("change_horizon", 0))
+                self._stamp = stamp
+            except Exception as e:
+                print(f"Error reading deadlines: {e}")
+                metrics.STORAGE_ERRORS.inc(operation="read")
+                self._records = None
+                self._stamp = None
+                return []
+        
+        records = self._records
+        
+        # Periodically move expired deadlines out of the hot store
+        if auto_archive and self.archive_after_days is not None:
+            now = time.time()
+            if now - self._last_archive_check >= self.archive_check_interval:
+                self._last_archive_check = now
+                # Archiving rewrites the file, so re-read it under the file lock
+                with self._file_lock:
+                    records = self._archive_expired(self._load_records(auto_archive=False))
+        
+        return records
     
-    def _save_deadlines(self, deadlines: List[Dict[str, Any]]) -> bool:
-        """Save deadlines to storage file."""
+    def _set_cache(self, records: List[Deadline], version: int,
+                   tombstones: List[Dict[str, Any]], change_horizon: int):
+        """Make records the cached state and index them. Caller must hold the lock."""
+        self._records = records
+        self._version = version
+        self._tombstones = tombstones
+        self._change_horizon = change_horizon
+        self._positions = {record.id: i for i, record in enumerate(records) if record.id}
+        # Records ordered by change sequence, for get_changes
+        self._by_seq = sorted(records, key=lambda record: record.seq or 0)
+        self._seqs = [record.seq or 0 for record in self._by_seq]
+    
+    def _encode_cursor(self, position: int, last_id: Optional[str]) -> str:
+        """Make an opaque cursor pointing just after last_id."""
+        raw = json.dumps({"p": position, "id": last_id}, separators=(',', ':'))
+        return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+    
+    def _decode_cursor(self, cursor: Optional[str]) -> int:
+        """Turn a cursor into the position to resume from. Caller must hold the lock.
+        
+        The ID of the last returned record is preferred over the stored
+        position, so pages stay stable when earlier records are deleted.
+        """
+        if not cursor:
+            return 0
         try:
-            with open(self.storage_file, 'w') as f:
-                json.dump(deadlines, f, indent=2)
-            return True
+            data = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+            last_position = self._positions.get(data.get("id"))
+            if last_position is not None:
+                return last_position + 1
+            return max(0, int(data.get("p", 0)))
+        except (ValueError, TypeError, AttributeError):
+            raise ValueError("Invalid cursor")
+    
+    def _file_stamp(self) -> Optional[tuple]:
+        """Identify the current version of the storage file on disk."""
+        try:
+            st = os.stat(self.storage_file)
+        except OSError:
+            return None
+        # Saves replace the file, so the inode changes on every write
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+    
+    def _archive_expired(self, records: List[Deadline],
+                         max_age_days: Optional[float] = None) -> List[Deadline]:
+        """Archive expired records and save the rest. Caller must hold the lock."""
+        if max_age_days is None:
+            max_age_days = self.archive_after_days
+        if max_age_days is None:
+            return records
+        
+        cutoff = datetime.datetime.now() - datetime.timedelta(days=max_age_days)
+        remaining = []
+        partitions = {}
+        
+        for record in records:
+            if record.due and record.due < cutoff:
+                key = (record.due.year, record.due.month)
+                partitions.setdefault(key, []).append(record)
+            else:
+                remaining.append(record)
+        
+        if not partitions:
+            return records
+        
+        # Write the archive first so a failure never loses records
+        try:
+            os.makedirs(self.archive_dir, exist_ok=True)
+            for (year, month), expired in partitions.items():
+                path = os.path.join(self.archive_dir, f"deadlines-{year:04d}-{month:02d}.jsonl.gz")
+                with gzip.open(path, 'at', encoding='utf-8') as f:
+                    for record in expired:
+                        f.write(json.dumps(record.to_dict()) + "\n")
+        except Exception as e:
+            print(f"Error archiving deadlines: {e}")
+            return records
+        
+        if not self._save_records(remaining, removal_reason="archived"):
+            return records
+        
+        return remaining
+    
+    def _archive_partitions(self) -> List[Any]:
+        """List archive partitions as ((year, month), path), oldest first."""
+        if not os.path.isdir(self.archive_dir):
+            return []
+        
+        partitions = []
+        for name in os.listdir(self.archive_dir):
+            match = re.match(r'^deadlines-(\d{4})-(\d{2})\.jsonl\.gz$', name)
+            if match:
+                month = (int(match.group(1)), int(match.group(2)))
+                partitions.append((month, os.path.join(self.archive_dir, name)))
+        
+        return sorted(partitions)
+    
+    def _read_archive_partition(self, path: str) -> List[Dict[str, Any]]:
+        """Read all deadlines from one archive partition."""
+        deadlines = []
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if line:
+                        deadlines.append(json.loads(line))
+        except Exception as e:
+            print(f"Error reading archive {path}: {e}")
+        return deadlines
+    
+    def _save_records(self, records: List[Deadline], removal_reason: str = "deleted") -> bool:
+        """Save records to storage file and make them the cached state.
+        
+        Records that are not in the cached state (new or replaced) get the new
+        version as their change sequence; records that disappeared get a
+        tombstone. The data is written to a temporary file next to the storage
+        file and renamed over it, so readers never see a half-written file.
+        """
+        version = self._version + 1
+        
+        # Cached records are never modified in place, so identity tells us
+        # exactly which records this save touches
+        cached = self._records or []
+        cached_objects = {id(record) for record in cached}
+        changed = []
+        for record in records:
+            if id(record) not in cached_objects:
+                record.seq = version
+                changed.append(record)
+        
+        kept_ids = {record.id for record in records}
+        removed_ids = [record.id for record in cached if record.id and record.id not in kept_ids]
+        tombstones = self._tombstones + [
+            {"id": deadline_id, "seq": version, "reason": removal_reason}
+            for deadline_id in removed_ids
+        ]
+        change_horizon = self._change_horizon
+        if len(tombstones) > self.max_tombstones:
+            pruned = tombstones[:-self.max_tombstones]
+            tombstones = tombstones[-self.max_tombstones:]
+            change_horizon = max(change_horizon, pruned[-1]["seq"])
+        
+        directory = os.path.dirname(os.path.abspath(self.storage_file))
+        tmp_path = None
+        try:
+            with metrics.STORAGE_WRITE_SECONDS.time():
+                fd, tmp_path = tempfile.mkstemp(prefix=".deadlines_", suffix=".tmp", dir=directory)
+                with os.fdopen(fd, 'w') as f:
+                    f.write(encode_store(records, version=version, change_horizon=change_horizon,
+                                         tombstones=tombstones))
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.storage_file)
+            self._set_cache(records, version, tombstones, change_horizon)
+            self._stamp = self._file_stamp()
         except Exception as e:
             print(f"Error saving deadlines: {e}")
+            metrics.STORAGE_ERRORS.inc(operation="write")
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
             return False
+        
+        self._notify_listeners(changed, removed_ids)
+        return True
+    
+    def _notify_listeners(self, changed: List[Deadline], removed_ids: List[str]):
+        """Tell change listeners about a save. Caller must hold the lock."""
+        for listener in self._change_listeners:
+            try:
+                listener(changed, removed_ids)
+            except Exception as e:
+                print(f"Error in storage change listener: {e}")
+    
+    def _commit_batches(self, batches: List[Dict[str, Any]]):
+        """Apply pending upsert batches with one read and one write. Caller must hold the lock.
+        
+        Every batch gets a result and is marked done, even if the commit
+        fails; callers of other threads are waiting on them.
+        """
+        try:
+            self._apply_batches(batches)
+        except Exception as e:
+            # Nothing was saved, so every batch of this commit is rejected
+            print(f"Error committing deadlines: {e}")
+            metrics.STORAGE_ERRORS.inc(operation="write")
+            for batch in batches:
+                batch["result"] = {
+                    "added": [],
+                    "merged": [],
+                    "rejected": [deadline.to_dict() if isinstance(deadline, Deadline) else deadline
+                                 for deadline in batch["deadlines"]],
+                    "error": str(e)
+                }
+        finally:
+            for batch in batches:
+                batch["done"].set()
+    
+    def _apply_batches(self, batches: List[Dict[str, Any]]):
+        """Merge batches into the stored records and save them. Caller must hold the lock."""
+        records = list(self._load_records())
+        changed = False
+        
+        for batch in batches:
+            result = {"added": [], "merged": [], "rejected": []}
+            
+            for deadline in batch["deadlines"]:
+                if not self._is_valid_deadline(deadline):
+                    result["rejected"].append(deadline)
+                    continue
+                
+                record = deadline if isinstance(deadline, Deadline) else Deadline.from_dict(deadline)
+                
+                index = next((i for i, existing in enumerate(records)
+                              if self._are_similar_deadlines(record, existing)), None)
+                
+                if index is not None:
+                    merged = self._merge_deadline(records[index], record)
+                    if merged is not records[index]:
+                        records[index] = merged
+                        changed = True
+                    result["merged"].append(merged.to_dict())
+                    continue
+                
+                if not record.id:
+                    record.id = self._generate_id()
+                    if isinstance(deadline, dict):
+                        deadline['id'] = record.id
+                records.append(record)
+                result["added"].append(record.to_dict())
+                changed = True
+            
+            batch["result"] = result
+        
+        if changed and not self._save_records(records):
+            # Nothing was persisted, so nothing was added or merged
+            for batch in batches:
+                result = batch["result"]
+                result["rejected"].extend(result["added"] + result["merged"])
+                result["added"] = []
+                result["merged"] = []
     
-    def _is_valid_deadline(self, deadline: Dict[str, Any]) -> bool:
+    def _merge_deadline(self, existing: Deadline, new_record: Deadline) -> Deadline:
+        """Fill fields missing from an existing record.
+        
+        Returns a new merged record, or the existing one if nothing changed.
+        Cached records are never modified in place.
+        """
+        current = existing.to_dict()
+        changed = False
+        
+        for key, value in new_record.to_dict().items():
+            if key == 'id' or value in (None, ""):
+                continue
+            if current.get(key) in (None, ""):
+                current[key] = value
+                changed = True
+        
+        # Keep the longer, more informative details
+        new_details = new_record.details or ""
+        if len(new_details) > len(current.get('details') or ""):
+            current['details'] = new_details
+            changed = True
+        
+        return Deadline.from_dict(current) if changed else existing
+    
+    def _generate_id(self) -> str:
+        """Generate a unique deadline ID."""
+        return f"dl_{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}_{uuid.uuid4().hex[:8]}"
+    
+    def _is_valid_deadline(self, deadline: Union[Dict[str, Any], Deadline]) -> bool:
         """Check if deadline has required fields."""
+        if isinstance(deadline, Deadline):
+            return isinstance(deadline.task, str)
         return (
             isinstance(deadline, dict) and
-            'task' in deadline and
+            isinstance(deadline.get('task'), str) and
             'deadline' in deadline
         )
     
-    def _is_duplicate(self, new_deadline: Dict[str, Any]) -> bool:
-        """Check if a similar deadline already exists."""
-        existing_deadlines = self.get_all_deadlines()
-        return any(self._are_similar_deadlines(new_deadline, existing) 
-                  for existing in existing_deadlines)
-    
-    def _are_similar_deadlines(self, deadline1: Dict[str, Any], deadline2: Dict[str, Any]) -> bool:
+    def _are_similar_deadlines(self, deadline1: Deadline, deadline2: Deadline) -> bool:
         """Check if two deadlines are similar (likely the same task)."""
         # If they have the same source email, similar task name, and same deadline date
-        same_source = (deadline1.get('source_email_id') == deadline2.get('source_email_id') and
-                       deadline1.get('source_email_id') is not None)
+        same_source = (deadline1.source_email_id == deadline2.source_email_id and
+                       deadline1.source_email_id is not None)
         
         # Compare task names (if one is substring of the other or very similar)
-        task1 = deadline1.get('task', '').lower()
-        task2 = deadline2.get('task', '').lower()
+        task1 = (deadline1.task or '').lower()
+        task2 = (deadline2.task or '').lower()
         similar_task = (task1 in task2 or task2 in task1) or self._similarity_score(task1, task2) > 0.7
         
         # Compare dates (if they're the same day)
-        date1 = self._parse_deadline_date(deadline1.get('deadline'))
-        date2 = self._parse_deadline_date(deadline2.get('deadline'))
+        date1 = deadline1.due
+        date2 = deadline2.due
         same_day = (date1 and date2 and 
                    date1.year == date2.year and 
                    date1.month == date2.month and 
@@ -181,22 +696,154 @@ class DeadlineStorage:
             
         common_words = words1.intersection(words2)
         return len(common_words) / max(len(words1), len(words2))
+
+class ShardedDeadlineStorage:
+    def __init__(self, storage_dir="shards", max_open_shards=64,
+                 default_storage_file=None, **storage_options):
+        """Initialize per-account storage, one DeadlineStorage shard per mailbox.
+        
+        Shards are opened lazily and at most max_open_shards are kept open,
+        least recently used first out. Requests without an account go to
+        default_storage_file (or a "default" shard). Extra keyword arguments
+        are passed on to each DeadlineStorage.
+        """
+        self.storage_dir = storage_dir
+        self.max_open_shards = max_open_shards
+        self.default_storage_file = default_storage_file
+        self.storage_options = storage_options
+        self.lock = threading.Lock()  # Guards the open shard table only
+        self._shards = OrderedDict()  # Shard file path -> DeadlineStorage
+        self._change_listeners = []
+        self._refresh_stamps = {}  # Shard file path -> file stamp seen by the last refresh
+        
+        os.makedirs(storage_dir, exist_ok=True)
     
-    def _parse_deadline_date(self, date_str: Optional[str]) -> Optional[datetime.datetime]:
-        """Parse deadline string to datetime object."""
-        if not date_str:
-            return None
-            
-        try:
-            # Try direct parsing (ISO format)
-            return datetime.datetime.fromisoformat(date_str.replace('Z', '+00:00'))
-        except (ValueError, TypeError):
-            # Try with dateutil for more flexible parsing
+    def for_account(self, account: Optional[str]) -> DeadlineStorage:
+        """Get the shard for a mailbox address, opening it if needed."""
+        return self._open_shard(self._shard_path(account))
+    
+    def migrate_default(self, account: str) -> int:
+        """Move the deadlines of the default shard into an account's shard.
+        
+        For data stored before per-account shards, which requests without an
+        account still see. Deadlines the account's shard rejects stay in the
+        default shard; the moved ones leave "migrated" tombstones there so
+        change feeds report them gone. Returns the number moved.
+        """
+        source = self.for_account(None)
+        target = self.for_account(account)
+        if source is target:
+            return 0
+        
+        with source.lock, source._file_lock:
+            records = list(source._load_records(auto_archive=False))
+            if not records:
+                return 0
+            result = target.upsert_deadlines([record.to_dict() for record in records])
+            rejected_ids = {deadline.get("id") for deadline in result["rejected"]}
+            remaining = [record for record in records if record.id in rejected_ids]
+            if len(remaining) < len(records):
+                source._save_records(remaining, removal_reason="migrated")
+        return len(records) - len(remaining)
+    
+    def add_change_listener(self, listener: Callable[[List[Deadline], List[str]], None]):
+        """Register a change callback on every shard, including ones opened later."""
+        with self.lock:
+            self._change_listeners.append(listener)
+            shards = list(self._shards.values())
+        for shard in shards:
+            shard.add_change_listener(listener)
+    
+    def refresh(self) -> bool:
+        """Pick up changes other processes made to any shard, including new shards.
+        
+        Only shards whose file changed since the last refresh are opened.
+        Returns True if any shard was reloaded, see DeadlineStorage.refresh.
+        """
+        refreshed = False
+        for path in self._shard_files():
             try:
-                import dateutil.parser
-                return dateutil.parser.parse(date_str)
-            except:
-                return None
+                st = os.stat(path)
+            except OSError:
+                continue
+            stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+            if self._refresh_stamps.get(path) == stamp:
+                continue
+            self._refresh_stamps[path] = stamp
+            refreshed = self._open_shard(path).refresh() or refreshed
+        return refreshed
+    
+    def get_all_records(self) -> List[Deadline]:
+        """Get the records of every shard."""
+        records = []
+        for shard in self._all_shards():
+            records.extend(shard.get_all_records())
+        return records
+    
+    def get_all_deadlines(self) -> List[Dict[str, Any]]:
+        """Get the deadlines of every shard."""
+        return [record.to_dict() for record in self.get_all_records()]
+    
+    def get_upcoming_records(self, hours_ahead=24) -> List[Deadline]:
+        """Get Deadline records coming up within specified hours, across all shards."""
+        upcoming = []
+        for shard in self._all_shards():
+            upcoming.extend(shard.get_upcoming_records(hours_ahead))
+        return upcoming
+    
+    def get_upcoming_deadlines(self, hours_ahead=24) -> List[Dict[str, Any]]:
+        """Get deadlines coming up within specified hours, across all shards."""
+        return [record.to_dict() for record in self.get_upcoming_records(hours_ahead)]
+    
+    def _shard_path(self, account: Optional[str]) -> str:
+        """Map a mailbox address to its shard file."""
+        account = (account or "").strip().lower()
+        if not account:
+            if self.default_storage_file:
+                return self.default_storage_file
+            return os.path.join(self.storage_dir, "default.json")
+        
+        # Keep the name readable but make it unique and filesystem safe
+        safe_name = re.sub(r'[^a-z0-9@._-]', '_', account)[:64]
+        digest = hashlib.sha1(account.encode('utf-8')).hexdigest()[:8]
+        return os.path.join(self.storage_dir, f"{safe_name}_{digest}.json")
+    
+    def _open_shard(self, path: str) -> DeadlineStorage:
+        """Return the open shard for a path, evicting the least recently used ones."""
+        with self.lock:
+            shard = self._shards.get(path)
+            if shard is not None:
+                self._shards.move_to_end(path)
+                return shard
+            
+            # Reads of an account that never stored anything must not leave a file behind
+            shard = DeadlineStorage(path, create_file=False, **self.storage_options)
+            for listener in self._change_listeners:
+                shard.add_change_listener(listener)
+            self._shards[path] = shard
+            
+            # Evict idle shards past the cap; a shard in use is kept until next time
+            for old_path in list(self._shards):
+                if len(self._shards) <= self.max_open_shards:
+                    break
+                old_shard = self._shards[old_path]
+                if old_shard is not shard and not old_shard.lock.locked():
+                    del self._shards[old_path]
+            
+            return shard
+    
+    def _shard_files(self) -> List[str]:
+        """Paths of every shard that exists on disk."""
+        paths = [os.path.join(self.storage_dir, name)
+                 for name in sorted(os.listdir(self.storage_dir))
+                 if name.endswith('.json')]
+        if self.default_storage_file and os.path.exists(self.default_storage_file):
+            paths.append(self.default_storage_file)
+        return paths
+    
+    def _all_shards(self) -> List[DeadlineStorage]:
+        """Open every shard that exists on disk."""
+        return [self._open_shard(path) for path in self._shard_files()]
 
 # Usage example
 if __name__ == "__main__":
@@ -5,25 +5,39 @@ import datetime
 import dateutil.parser
 import re
 import os
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Tuple, Iterator
+import metrics
+
+class EmailReaderError(Exception):
+    """The mailbox could not be read (connection, login, folder or search failed)."""
 
 class EmailReader:
-    def __init__(self, email_address, password, imap_server="imap.gmail.com", imap_port=993):
-        """Initialize email reader with credentials."""
+    def __init__(self, email_address, password, imap_server="imap.gmail.com", imap_port=993, use_ssl=True):
+        """Initialize email reader with credentials.
+        
+        use_ssl=False connects over plain IMAP, e.g. to a local test server.
+        """
         self.email_address = email_address
         self.password = password
         self.imap_server = imap_server
         self.imap_port = imap_port
+        self.use_ssl = use_ssl
         self.connection = None
+        self.last_error = None  # Why the last connect() failed
     
     def connect(self) -> bool:
         """Establish connection to the IMAP server."""
         try:
-            self.connection = imaplib.IMAP4_SSL(self.imap_server, self.imap_port)
-            self.connection.login(self.email_address, self.password)
+            with metrics.IMAP_CONNECT_SECONDS.time():
+                imap_class = imaplib.IMAP4_SSL if self.use_ssl else imaplib.IMAP4
+                self.connection = imap_class(self.imap_server, self.imap_port)
+                self.connection.login(self.email_address, self.password)
+            self.last_error = None
             return True
         except Exception as e:
             print(f"Connection error: {e}")
+            metrics.IMAP_ERRORS.inc(operation="connect")
+            self.last_error = str(e)
             return False
     
     def disconnect(self):
@@ -34,69 +48,96 @@ class EmailReader:
                 self.connection.logout()
             except:
                 pass
+            self.connection = None
     
     def get_recent_emails(self, folder="INBOX", days=7, limit=50) -> List[Dict[str, Any]]:
-        """Fetch recent emails from specified folder."""
+        """Fetch recent emails from specified folder.
+        
+        Errors are printed and end the list early rather than raising.
+        """
+        emails = []
+        try:
+            for message_id, raw_email in self.iter_raw_emails(folder, days=days, limit=limit):
+                emails.append(self.parse_email(message_id, raw_email))
+        except EmailReaderError as e:
+            print(f"Error fetching emails: {e}")
+        return emails
+    
+    def iter_raw_emails(self, folder="INBOX", days=7, limit=50) -> Iterator[Tuple[str, bytes]]:
+        """Yield (message_id, raw RFC822 bytes) for recent emails, newest first.
+        
+        Messages are fetched one at a time, so a caller can start parsing the
+        first one while the rest are still downloading. Raises
+        EmailReaderError if the mailbox cannot be read, so a failed login
+        is not mistaken for an empty mailbox; a single message that fails to
+        download is skipped.
+        """
         if not self.connection:
             if not self.connect():
-                return []
+                raise EmailReaderError(f"Could not connect to {self.imap_server}: {self.last_error}")
         
-        emails_data = []
         try:
             status, messages = self.connection.select(folder)
             if status != "OK":
-                print(f"Error selecting folder: {status}")
-                return []
+                raise EmailReaderError(f"Could not select folder {folder}: {status}")
             
             # Calculate date from days ago
             date_since = (datetime.datetime.now() - datetime.timedelta(days=days)).strftime("%d-%b-%Y")
             status, data = self.connection.search(None, f'(SINCE "{date_since}")')
             
             if status != "OK":
-                print("No messages found!")
-                return []
+                raise EmailReaderError(f"Could not search folder {folder}: {status}")
             
             # Get message IDs and process the most recent ones first (up to limit)
             message_ids = data[0].split()
             message_ids = message_ids[-limit:] if limit and len(message_ids) > limit else message_ids
             
             for message_id in reversed(message_ids):
-                status, msg_data = self.connection.fetch(message_id, "(RFC822)")
+                with metrics.tracer.span("fetch", trace_id=message_id.decode()):
+                    with metrics.IMAP_FETCH_SECONDS.time():
+                        status, msg_data = self.connection.fetch(message_id, "(RFC822)")
                 if status != "OK":
+                    metrics.IMAP_ERRORS.inc(operation="fetch")
                     continue
                 
-                raw_email = msg_data[0][1]
-                email_message = email.message_from_bytes(raw_email)
-                
-                # Extract basic email information
-                subject = self._decode_email_header(email_message.get("Subject", ""))
-                from_address = self._decode_email_header(email_message.get("From", ""))
-                date_str = email_message.get("Date", "")
-                
-                try:
-                    date = dateutil.parser.parse(date_str) if date_str else None
-                except:
-                    date = None
-                
-                # Extract email body
-                body = self._get_email_body(email_message)
-                
-                emails_data.append({
-                    "id": message_id.decode(),
-                    "subject": subject,
-                    "from": from_address,
-                    "date": date,
-                    "body": body
-                })
-            
-            return emails_data
+                yield message_id.decode(), msg_data[0][1]
         
+        except EmailReaderError:
+            raise
         except Exception as e:
-            print(f"Error fetching emails: {e}")
-            return []
+            metrics.IMAP_ERRORS.inc(operation="fetch")
+            raise EmailReaderError(f"Error fetching emails: {e}") from e
         finally:
             self.disconnect()
     
+    def parse_email(self, message_id: str, raw_email: bytes) -> Dict[str, Any]:
+        """Parse a raw RFC822 message into the email dict used by the extractor."""
+        with metrics.tracer.span("parse", trace_id=message_id):
+            return self._parse_message(message_id, email.message_from_bytes(raw_email))
+    
+    def _parse_message(self, message_id: str, email_message) -> Dict[str, Any]:
+        """Build the email dict from a parsed message."""
+        # Extract basic email information
+        subject = self._decode_email_header(email_message.get("Subject", ""))
+        from_address = self._decode_email_header(email_message.get("From", ""))
+        date_str = email_message.get("Date", "")
+        
+        try:
+            date = dateutil.parser.parse(date_str) if date_str else None
+        except:
+            date = None
+        
+        # Extract email body
+        body = self._get_email_body(email_message)
+        
+        return {
+            "id": message_id,
+            "subject": subject,
+            "from": from_address,
+            "date": date,
+            "body": body
+        }
+    
     def _decode_email_header(self, header):
         """Decode email header to readable format."""
         if not header:
@@ -0,0 +1,90 @@
+import os
+from typing import Optional
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows
+    fcntl = None
+
+class FileLock:
+    # Without fcntl every acquire succeeds, which is only safe for a single process
+    supported = fcntl is not None
+
+    def __init__(self, path: str):
+        """An exclusive advisory lock on a file, shared between processes.
+
+        The lock is reentrant for its holder so nested critical sections can
+        take it again. It is not thread-safe: threads in one process must
+        serialize their use of one FileLock with their own lock. Separate
+        FileLock objects on the same path exclude each other, even within
+        one process.
+        """
+        self.path = path
+        self._file = None
+        self._depth = 0
+
+    @property
+    def held(self) -> bool:
+        return self._depth > 0
+
+    def acquire(self, blocking=True) -> bool:
+        """Take the lock, returns False if blocking is False and another holder has it."""
+        if self._depth:
+            self._depth += 1
+            return True
+
+        if fcntl is not None:
+            if self._file is None:
+                directory = os.path.dirname(os.path.abspath(self.path))
+                os.makedirs(directory, exist_ok=True)
+                self._file = open(self.path, 'a+')
+            flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+            try:
+                fcntl.flock(self._file.fileno(), flags)
+            except BlockingIOError:
+                return False
+
+        self._depth = 1
+        return True
+
+    def release(self):
+        """Release one level of the lock; the file is unlocked when the outermost holder releases."""
+        if not self._depth:
+            return
+        self._depth -= 1
+        if self._depth == 0 and fcntl is not None and self._file is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+
+    def write_owner(self, text: str):
+        """Record who holds the lock (e.g. a pid) in the lock file. Caller must hold the lock."""
+        if self._file is None:
+            return
+        self._file.seek(0)
+        self._file.truncate()
+        self._file.write(text)
+        self._file.flush()
+
+    def read_owner(self) -> Optional[str]:
+        """Read what the current holder recorded with write_owner."""
+        try:
+            with open(self.path, 'r') as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+    def close(self):
+        """Release the lock completely and close the lock file."""
+        if self._depth:
+            self._depth = 1
+            self.release()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+        return False
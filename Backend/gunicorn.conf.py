@@ -0,0 +1,38 @@
+# Gunicorn settings for the API server: gunicorn -c gunicorn.conf.py
+import os
+import multiprocessing
+
+wsgi_app = "wsgi:app"
+bind = os.environ.get("IMPEMAIL_BIND", "0.0.0.0:5000")
+
+# One process per core for request handling
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+
+# An open notification stream (/api/notifications/stream) keeps its request
+# running for as long as the client is connected. With gevent each stream
+# is a greenlet, so idle clients are cheap and worker_connections bounds
+# them per worker. The thread fallback ties up one of `threads` per stream:
+# a worker serves nothing else once all its threads hold streams, so size
+# IMPEMAIL_THREADS well above the streams each worker is expected to hold.
+try:
+    import gevent
+    default_worker_class = "gevent"
+except ImportError:
+    default_worker_class = "gthread"
+worker_class = os.environ.get("IMPEMAIL_WORKER_CLASS", default_worker_class)
+worker_connections = int(os.environ.get("IMPEMAIL_WORKER_CONNECTIONS", 1000))
+threads = int(os.environ.get("IMPEMAIL_THREADS", 64))
+
+# Workers write their metrics here so /metrics can add them all up; the
+# environment is inherited by the workers
+os.environ.setdefault("IMPEMAIL_METRICS_DIR",
+                      os.path.join(os.path.dirname(os.path.abspath(__file__)), "metrics_shared"))
+
+def on_starting(server):
+    """Start counting from zero, like a single-process server would."""
+    import metrics
+    metrics.clear_shared_directory(os.environ["IMPEMAIL_METRICS_DIR"])
+
+# Threads do not survive fork, so the app (and its background threads) must
+# be loaded in each worker rather than once in the master
+preload_app = False
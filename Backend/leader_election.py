@@ -0,0 +1,92 @@
+import os
+import socket
+import threading
+from typing import Callable, Optional
+from file_lock import FileLock
+
+class LeaderElection:
+    def __init__(self, lock_file: str, on_elected: Callable[[], None],
+                 on_demoted: Optional[Callable[[], None]] = None,
+                 poll_seconds=1.0, retry_seconds=30.0):
+        """Elect one process out of several to run a singleton job.
+
+        Every process calls start(). A background thread tries to take an
+        exclusive lock on lock_file every poll_seconds; the process that gets
+        it is the leader and on_elected is called. The operating system drops
+        the lock when the leader exits or dies, so a waiting process takes
+        over within poll_seconds. If on_elected raises, the process steps
+        down so another one can lead, and runs again after retry_seconds.
+        stop() gives up leadership (calling on_demoted) or the candidacy.
+        """
+        self.lock_file = lock_file
+        self.on_elected = on_elected
+        self.on_demoted = on_demoted
+        self.poll_seconds = poll_seconds
+        self.retry_seconds = retry_seconds
+        self._lock = FileLock(lock_file)
+        self._state_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+        self.is_leader = False
+
+    def start(self):
+        """Become a candidate; returns immediately."""
+        if self._thread is not None:
+            return
+        if not FileLock.supported:
+            print("File locking is unavailable, assuming this is the only process")
+        self._thread = threading.Thread(target=self._campaign, name="leader-election")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Step down if leading, otherwise stop waiting to lead."""
+        self._stopped.set()
+        with self._state_lock:
+            was_leader = self.is_leader
+            self.is_leader = False
+        if was_leader:
+            self._step_down()
+
+    def leader(self) -> Optional[str]:
+        """Who currently leads, as "host:pid", if anyone has said so."""
+        return self._lock.read_owner()
+
+    def _campaign(self):
+        """Wait for the lock, then lead until stopped or the process exits."""
+        while not self._stopped.is_set():
+            # Poll instead of blocking in flock, so stop() is never stuck behind it
+            if not self._lock.acquire(blocking=False):
+                self._stopped.wait(self.poll_seconds)
+                continue
+
+            with self._state_lock:
+                if self._stopped.is_set():
+                    self._lock.close()
+                    return
+                self.is_leader = True
+            self._lock.write_owner(f"{socket.gethostname()}:{os.getpid()}")
+            print(f"Elected leader for {self.lock_file} (pid {os.getpid()})")
+
+            try:
+                self.on_elected()
+                return
+            except Exception as e:
+                print(f"Error starting as leader, stepping down: {e}")
+
+            # Holding the lock without doing the job would leave nobody doing it
+            with self._state_lock:
+                was_leader = self.is_leader
+                self.is_leader = False
+            if was_leader:
+                self._step_down()
+            self._stopped.wait(self.retry_seconds)
+
+    def _step_down(self):
+        """Undo on_elected and release the lock."""
+        if self.on_demoted:
+            try:
+                self.on_demoted()
+            except Exception as e:
+                print(f"Error stepping down as leader: {e}")
+        self._lock.close()
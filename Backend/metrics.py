@@ -0,0 +1,353 @@
+import os
+import json
+import time
+import uuid
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional, Tuple
+
+# Latency buckets in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Prompt size buckets in characters
+SIZE_BUCKETS = (256, 512, 1024, 2048, 4096, 8192, 16384, 32768, 65536)
+
+def _label_key(labels: Dict[str, Any]) -> Tuple[Tuple[str, str], ...]:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def _format_labels(key: Tuple[Tuple[str, str], ...], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = [(k, v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) for k, v in pairs]
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+class Counter:
+    def __init__(self, name: str, help_text: str):
+        """A monotonically increasing count, per label set."""
+        self.name = name
+        self.help_text = help_text
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            values = [[list(key), value] for key, value in self.values.items()]
+        return {"type": "counter", "help": self.help_text, "values": values}
+
+    def merge(self, snapshot: Dict[str, Any]):
+        """Add the values of another process's snapshot."""
+        with self.lock:
+            for key, value in snapshot["values"]:
+                key = tuple(tuple(pair) for pair in key)
+                self.values[key] = self.values.get(key, 0) + value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            for key, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets=DEFAULT_BUCKETS):
+        """Observations counted into cumulative buckets, per label set."""
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(sorted(buckets))
+        self.lock = threading.Lock()
+        self.values = {}  # Label key -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        with self.lock:
+            data = self.values.get(key)
+            if data is None:
+                data = self.values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    data[i] += 1
+                    break
+            data[-2] += value
+            data[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe how long the block takes, in seconds."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            values = [[list(key), list(data)] for key, data in self.values.items()]
+        return {"type": "histogram", "help": self.help_text, "buckets": list(self.buckets), "values": values}
+
+    def merge(self, snapshot: Dict[str, Any]):
+        """Add the values of another process's snapshot with the same buckets."""
+        if tuple(snapshot["buckets"]) != self.buckets:
+            return
+        with self.lock:
+            for key, data in snapshot["values"]:
+                key = tuple(tuple(pair) for pair in key)
+                current = self.values.get(key)
+                if current is None:
+                    self.values[key] = list(data)
+                else:
+                    self.values[key] = [a + b for a, b in zip(current, data)]
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            for key, data in sorted(self.values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, data):
+                    cumulative += count
+                    lines.append(f"{self.name}_bucket{_format_labels(key, ('le', repr(float(bound))))} {cumulative}")
+                lines.append(f"{self.name}_bucket{_format_labels(key, ('le', '+Inf'))} {data[-1]}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {data[-2]}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {data[-1]}")
+        return lines
+
+class MetricsRegistry:
+    def __init__(self):
+        """Named counters and histograms rendered in Prometheus text format."""
+        self.lock = threading.Lock()
+        self.metrics = {}
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        """Get or create a counter."""
+        return self._get_or_create(name, lambda: Counter(name, help_text))
+
+    def histogram(self, name: str, help_text: str, buckets=DEFAULT_BUCKETS) -> Histogram:
+        """Get or create a histogram."""
+        return self._get_or_create(name, lambda: Histogram(name, help_text, buckets))
+
+    def render(self) -> str:
+        """Render every metric in Prometheus text exposition format."""
+        with self.lock:
+            metrics = [self.metrics[name] for name in sorted(self.metrics)]
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current values of every metric, as JSON-serializable data."""
+        with self.lock:
+            metrics = list(self.metrics.items())
+        return {name: metric.snapshot() for name, metric in metrics}
+
+    def merge(self, snapshot: Dict[str, Any]):
+        """Add the values of a snapshot, creating metrics this registry lacks."""
+        for name, data in snapshot.items():
+            if data.get("type") == "counter":
+                self.counter(name, data["help"]).merge(data)
+            elif data.get("type") == "histogram":
+                self.histogram(name, data["help"], data["buckets"]).merge(data)
+
+    def _get_or_create(self, name, factory):
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = factory()
+            return metric
+
+class SharedMetrics:
+    def __init__(self, registry: MetricsRegistry, directory: Optional[str] = None, write_seconds=2.0):
+        """Combine the metrics of several worker processes through a directory.
+
+        With a directory, each process writes a snapshot of its registry to
+        its own file there every write_seconds, and render() sums the files
+        of all processes, so a scrape that reaches any worker sees the whole
+        server, at most write_seconds old. Only the files are summed, so
+        every worker reports the same figures. Files of exited workers are
+        kept so counters never go backwards; clear the directory when the
+        server starts (see gunicorn.conf.py). Without a directory, render()
+        is just this process's registry.
+        """
+        self.registry = registry
+        self.directory = directory
+        self.write_seconds = write_seconds
+        self._file = None
+        self._file_pid = None
+        self._thread = None
+        self._stopped = threading.Event()
+
+    def start(self):
+        """Write this process's snapshot periodically. Call after forking."""
+        if not self.directory or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="metrics-writer")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def write(self):
+        """Write this process's current snapshot."""
+        if not self.directory:
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(prefix=".metrics_", suffix=".tmp", dir=self.directory)
+            with os.fdopen(fd, 'w') as f:
+                json.dump(self.registry.snapshot(), f, separators=(',', ':'))
+            os.replace(tmp_path, self._snapshot_file())
+        except OSError as e:
+            print(f"Error writing metrics snapshot: {e}")
+
+    def render(self) -> str:
+        """Metrics of every process in Prometheus text format."""
+        if not self.directory:
+            return self.registry.render()
+
+        combined = MetricsRegistry()
+        for name in sorted(os.listdir(self.directory)):
+            if not (name.startswith("metrics_") and name.endswith(".json")):
+                continue
+            try:
+                with open(os.path.join(self.directory, name), 'r') as f:
+                    combined.merge(json.load(f))
+            except (OSError, ValueError) as e:
+                print(f"Error reading metrics snapshot {name}: {e}")
+        return combined.render()
+
+    def _snapshot_file(self) -> str:
+        """This process's file; a forked child gets a new one."""
+        if self._file_pid != os.getpid():
+            # A replacement worker can reuse a pid, so add a unique part
+            self._file_pid = os.getpid()
+            self._file = os.path.join(self.directory, f"metrics_{self._file_pid}_{uuid.uuid4().hex[:8]}.json")
+        return self._file
+
+    def _run(self):
+        while not self._stopped.wait(self.write_seconds):
+            self.write()
+
+def clear_shared_directory(directory: str):
+    """Remove the snapshots of a previous server run."""
+    if not os.path.isdir(directory):
+        return
+    for name in os.listdir(directory):
+        if name.startswith("metrics_") and name.endswith(".json"):
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
+
+class _NoopSpan:
+    """Stand-in span used when tracing is off."""
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **attributes):
+        pass
+
+_NOOP_SPAN = _NoopSpan()
+
+class _Span:
+    def __init__(self, tracer: "Tracer", name: str, trace_id: Optional[str], attributes: Dict[str, Any]):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = trace_id or uuid.uuid4().hex
+        self.attributes = attributes
+
+    def __enter__(self):
+        self.start_wall = time.time()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.tracer._write({
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "start": self.start_wall,
+            "duration_seconds": time.perf_counter() - self.start,
+            "error": repr(exc) if exc is not None else None,
+            "attributes": self.attributes
+        })
+        return False
+
+    def set(self, **attributes):
+        """Add attributes to the span."""
+        self.attributes.update(attributes)
+
+class Tracer:
+    def __init__(self, trace_file: Optional[str] = None):
+        """Write trace spans as JSON lines to trace_file; does nothing when it is None."""
+        self.lock = threading.Lock()
+        self.trace_file = trace_file
+
+    @property
+    def enabled(self) -> bool:
+        return self.trace_file is not None
+
+    def configure(self, trace_file: Optional[str]):
+        """Turn tracing on (with a file path) or off (None)."""
+        self.trace_file = trace_file
+
+    def span(self, name: str, trace_id: Optional[str] = None, **attributes):
+        """Context manager timing a named operation. Spans sharing a trace_id
+        (e.g. an email's message id) belong to the same trace."""
+        if self.trace_file is None:
+            return _NOOP_SPAN
+        return _Span(self, name, trace_id, attributes)
+
+    def _write(self, span: Dict[str, Any]):
+        line = json.dumps(span, default=str) + "\n"
+        with self.lock:
+            try:
+                with open(self.trace_file, 'a') as f:
+                    f.write(line)
+            except (OSError, TypeError) as e:
+                print(f"Error writing trace span: {e}")
+
+# Process-wide registry and tracer; set IMPEMAIL_TRACE_FILE to enable tracing
+registry = MetricsRegistry()
+tracer = Tracer(os.environ.get("IMPEMAIL_TRACE_FILE"))
+shared = SharedMetrics(registry, os.environ.get("IMPEMAIL_METRICS_DIR"))
+
+# IMAP
+IMAP_CONNECT_SECONDS = registry.histogram("impemail_imap_connect_seconds", "Time to connect and log in to the IMAP server")
+IMAP_FETCH_SECONDS = registry.histogram("impemail_imap_fetch_seconds", "Time to fetch one message over IMAP")
+IMAP_ERRORS = registry.counter("impemail_imap_errors_total", "IMAP failures by operation")
+
+# LLM
+LLM_REQUEST_SECONDS = registry.histogram("impemail_llm_request_seconds", "LLM request latency by purpose")
+LLM_PROMPT_CHARS = registry.histogram("impemail_llm_prompt_chars", "LLM prompt size in characters by purpose", buckets=SIZE_BUCKETS)
+LLM_TOKENS = registry.counter("impemail_llm_tokens_total", "LLM tokens reported by the server, by purpose and kind")
+LLM_ERRORS = registry.counter("impemail_llm_errors_total", "LLM requests that failed, by purpose")
+LLM_PARSE_FAILURES = registry.counter("impemail_llm_parse_failures_total", "LLM responses that could not be parsed, by purpose")
+
+# Storage
+STORAGE_READ_SECONDS = registry.histogram("impemail_storage_read_seconds", "Time to read and decode a storage file")
+STORAGE_WRITE_SECONDS = registry.histogram("impemail_storage_write_seconds", "Time to encode and write a storage file")
+STORAGE_ERRORS = registry.counter("impemail_storage_errors_total", "Storage failures by operation")
+
+# Notification delivery
+DELIVERY_SECONDS = registry.histogram("impemail_notification_delivery_seconds", "Notification handler call latency by handler")
+DELIVERY_FAILURES = registry.counter("impemail_notification_delivery_failures_total", "Failed notification handler calls by handler and reason")
+DELIVERY_DEAD_LETTERS = registry.counter("impemail_notification_dead_letters_total", "Notifications given up on, by handler")
+
+# API responses
+RESPONSE_CACHE = registry.counter("impemail_response_cache_total", "Encoded response cache lookups by result")
+
+def record_llm_usage(purpose: str, result: Dict[str, Any]):
+    """Count the token usage reported in an Ollama response."""
+    if result.get("prompt_eval_count"):
+        LLM_TOKENS.inc(result["prompt_eval_count"], purpose=purpose, kind="prompt")
+    if result.get("eval_count"):
+        LLM_TOKENS.inc(result["eval_count"], purpose=purpose, kind="completion")
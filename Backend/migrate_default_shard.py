@@ -0,0 +1,19 @@
+"""Move deadlines stored before per-account shards into an account's shard.
+
+Requests without an account (no X-Account header or account parameter)
+keep reading deadlines.json. Once a client sends its account, run
+
+    python migrate_default_shard.py you@example.com
+
+so it sees the deadlines stored there earlier.
+"""
+import sys
+from deadline_storage import ShardedDeadlineStorage
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print(__doc__)
+        sys.exit(1)
+    storage = ShardedDeadlineStorage("shards", default_storage_file="deadlines.json")
+    moved = storage.migrate_default(sys.argv[1])
+    print(f"Moved {moved} deadlines to the shard of {sys.argv[1]}")
@@ -0,0 +1,269 @@
+import json
+import time
+import queue
+import datetime
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Dict, Any, List, Optional, Callable
+import metrics
+
+class DeadLetterStore:
+    def __init__(self, dead_letter_file="dead_letters.jsonl"):
+        """Append-only store of notifications that could not be delivered."""
+        self.dead_letter_file = dead_letter_file
+        self.lock = threading.Lock()
+
+    def add(self, handler_name: str, notification: Dict[str, Any], error: str, attempts: int):
+        """Record an undeliverable notification."""
+        entry = {
+            "handler": handler_name,
+            "error": error,
+            "attempts": attempts,
+            "timestamp": datetime.datetime.now().isoformat(),
+            "notification": notification
+        }
+        with self.lock:
+            try:
+                with open(self.dead_letter_file, 'a') as f:
+                    f.write(json.dumps(entry, default=str) + "\n")
+            except OSError as e:
+                print(f"Error writing dead letter: {e}")
+
+    def get_all(self) -> List[Dict[str, Any]]:
+        """Read all dead letters, oldest first."""
+        entries = []
+        with self.lock:
+            try:
+                with open(self.dead_letter_file, 'r') as f:
+                    for line in f:
+                        if line.strip():
+                            entries.append(json.loads(line))
+            except (FileNotFoundError, json.JSONDecodeError):
+                pass
+        return entries
+
+class HandlerChannel:
+    def __init__(self, name: str, handler: Callable[[Dict[str, Any]], None], dead_letters: DeadLetterStore,
+                 timeout=10.0, max_retries=3, backoff_seconds=1.0, queue_size=1000, workers=1):
+        """Deliver notifications to one handler from its own bounded queue.
+
+        Each call runs with a timeout. A failed or timed-out delivery is retried
+        up to max_retries times with exponential backoff starting at
+        backoff_seconds, then goes to the dead-letter store. A slow handler
+        only holds up its own channel.
+        """
+        self.name = name
+        self.handler = handler
+        self.dead_letters = dead_letters
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.workers = workers
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.executor = None  # Created by start(), shut down by stop()
+        self.threads = []
+        self.running = False
+
+        # Metrics
+        self.lock = threading.Lock()
+        self.delivered = 0
+        self.failed_attempts = 0
+        self.timeouts = 0
+        self.dead_lettered = 0
+        self.dropped = 0
+        self.latencies = deque(maxlen=1000)  # Seconds, most recent successful calls
+        self.started_at = time.monotonic()
+
+    def start(self):
+        """Start the channel's delivery workers.
+
+        Notifications submitted while the channel was stopped are delivered.
+        """
+        if self.running:
+            return
+        self.running = True
+        self.started_at = time.monotonic()
+        # Extra threads so a call that hangs past its timeout does not starve the channel
+        self.executor = ThreadPoolExecutor(max_workers=self.workers * 2, thread_name_prefix=f"deliver-{self.name}")
+        # Workers keep the queue and executor of the run they belong to
+        for _ in range(self.workers):
+            thread = threading.Thread(target=self._run_worker, args=(self.queue, self.executor))
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+    def stop(self, drain=True, timeout: Optional[float] = None):
+        """Stop the workers, optionally after delivering what is queued.
+
+        Whatever is still queued when the timeout runs out is dead-lettered,
+        and the workers are given until the timeout to finish the call they
+        are in. The channel can be started again afterwards, with a fresh
+        queue and executor.
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        if drain and self.running:
+            while self.queue.unfinished_tasks and (deadline is None or time.monotonic() < deadline):
+                time.sleep(0.05)
+        if not self.running:
+            return
+        self.running = False
+
+        # New submissions wait in a fresh queue for the next start()
+        with self.lock:
+            old_queue = self.queue
+            self.queue = queue.Queue(maxsize=old_queue.maxsize)
+        while True:
+            try:
+                notification = old_queue.get_nowait()
+            except queue.Empty:
+                break
+            old_queue.task_done()
+            if notification is not None:
+                self._dead_letter(notification, "channel stopped before delivery", 0)
+
+        threads, self.threads = self.threads, []
+        for _ in threads:
+            old_queue.put(None)
+        self.executor.shutdown(wait=False)
+        for thread in threads:
+            thread.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+
+    def submit(self, notification: Dict[str, Any]) -> bool:
+        """Queue a notification without blocking; full queues dead-letter it."""
+        try:
+            # Under the lock so stop() never swaps the queue in between
+            with self.lock:
+                self.queue.put_nowait(notification)
+            return True
+        except queue.Full:
+            with self.lock:
+                self.dropped += 1
+            self.dead_letters.add(self.name, notification, "queue full", 0)
+            return False
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Throughput and latency figures for this handler."""
+        with self.lock:
+            latencies = sorted(self.latencies)
+            elapsed = max(time.monotonic() - self.started_at, 1e-9)
+            metrics = {
+                "delivered": self.delivered,
+                "failed_attempts": self.failed_attempts,
+                "timeouts": self.timeouts,
+                "dead_lettered": self.dead_lettered,
+                "dropped": self.dropped,
+                "queue_depth": self.queue.qsize(),
+                "throughput_per_second": self.delivered / elapsed
+            }
+        if latencies:
+            metrics["latency_seconds"] = {
+                "avg": sum(latencies) / len(latencies),
+                "p50": latencies[len(latencies) // 2],
+                "p95": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+                "max": latencies[-1]
+            }
+        return metrics
+
+    def _run_worker(self, work_queue: queue.Queue, executor: ThreadPoolExecutor):
+        """Deliver notifications from one run's queue, one at a time."""
+        while True:
+            notification = work_queue.get()
+            try:
+                if notification is None:
+                    return
+                self._deliver(notification, executor)
+            except Exception as e:
+                # Never lose the worker, or the notification
+                print(f"Error delivering to {self.name}: {e}")
+                self._dead_letter(notification, str(e) or type(e).__name__, 0)
+            finally:
+                work_queue.task_done()
+
+    def _deliver(self, notification: Dict[str, Any], executor: ThreadPoolExecutor):
+        """Call the handler with timeout and retries."""
+        error = None
+        attempts = 0
+        for attempt in range(self.max_retries + 1):
+            if attempt > 0:
+                time.sleep(self.backoff_seconds * (2 ** (attempt - 1)))
+
+            start = time.perf_counter()
+            try:
+                future = executor.submit(self.handler, notification)
+            except RuntimeError as e:
+                # stop() shut the executor down while this was being retried
+                error = f"channel stopped: {e}"
+                break
+            attempts += 1
+            try:
+                future.result(timeout=self.timeout)
+                elapsed = time.perf_counter() - start
+                with self.lock:
+                    self.delivered += 1
+                    self.latencies.append(elapsed)
+                metrics.DELIVERY_SECONDS.observe(elapsed, handler=self.name)
+                return
+            except FutureTimeoutError:
+                future.cancel()
+                error = f"timed out after {self.timeout}s"
+                with self.lock:
+                    self.timeouts += 1
+                    self.failed_attempts += 1
+                metrics.DELIVERY_FAILURES.inc(handler=self.name, reason="timeout")
+            except Exception as e:
+                error = str(e) or type(e).__name__
+                with self.lock:
+                    self.failed_attempts += 1
+                metrics.DELIVERY_FAILURES.inc(handler=self.name, reason="error")
+
+            print(f"Delivery to {self.name} failed (attempt {attempt + 1}): {error}")
+
+        self._dead_letter(notification, error, attempts)
+
+    def _dead_letter(self, notification: Dict[str, Any], error: str, attempts: int):
+        with self.lock:
+            self.dead_lettered += 1
+        metrics.DELIVERY_DEAD_LETTERS.inc(handler=self.name)
+        self.dead_letters.add(self.name, notification, error, attempts)
+
+class DeliveryDispatcher:
+    def __init__(self, dead_letter_file="dead_letters.jsonl", queue_size=1000):
+        """Fan notifications out to handler channels without blocking the caller."""
+        self.dead_letters = DeadLetterStore(dead_letter_file)
+        self.queue_size = queue_size
+        self.channels = []
+        self.running = False
+
+    def add_handler(self, handler: Callable[[Dict[str, Any]], None], name: Optional[str] = None,
+                    timeout=10.0, max_retries=3, backoff_seconds=1.0, workers=1) -> HandlerChannel:
+        """Register a handler with its own queue, timeout and retry policy."""
+        name = name or getattr(handler, '__name__', None) or f"handler_{len(self.channels)}"
+        channel = HandlerChannel(name, handler, self.dead_letters, timeout=timeout,
+                                 max_retries=max_retries, backoff_seconds=backoff_seconds,
+                                 queue_size=self.queue_size, workers=workers)
+        self.channels.append(channel)
+        if self.running:
+            channel.start()
+        return channel
+
+    def start(self):
+        """Start delivering."""
+        self.running = True
+        for channel in self.channels:
+            channel.start()
+
+    def stop(self, drain=True, timeout: Optional[float] = 5.0):
+        """Stop delivering, by default after draining each queue for up to timeout seconds."""
+        self.running = False
+        for channel in self.channels:
+            channel.stop(drain=drain, timeout=timeout)
+
+    def deliver(self, notification: Dict[str, Any]):
+        """Queue a notification for every handler, returns immediately."""
+        for channel in self.channels:
+            channel.submit(notification)
+
+    def get_metrics(self) -> Dict[str, Dict[str, Any]]:
+        """Per-handler delivery metrics."""
+        return {channel.name: channel.get_metrics() for channel in self.channels}
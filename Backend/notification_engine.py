@@ -1,249 +1,323 @@
+import os
+import json
 import datetime
 import time
-import schedule
+import tempfile
+import heapq
+import itertools
 import threading
-import json
-import os
-import requests
 from typing import Dict, Any, List, Optional, Callable
+from deadline_record import Deadline
+from notification_ledger import NotificationLedger
+from notification_delivery import DeliveryDispatcher
+from reminder_text import ReminderTextCache, describe_time_context, format_deadline_date
+
+# Hours before a deadline at which reminders are sent
+REMINDER_THRESHOLDS = [48, 24, 3, 1]
+# Heap entries per deadline: a prepare and a send per threshold, plus an immediate one
+REMINDERS_PER_DEADLINE = 2 * len(REMINDER_THRESHOLDS) + 1
 
 class NotificationEngine:
     def __init__(self, 
                  storage_instance, 
                  llm_api_url="http://localhost:11434/api/generate",
-                 notification_file="notifications.json"):
-        """Initialize notification engine with storage and API info."""
+                 notification_file="notifications.json",
+                 notification_log="notifications.log",
+                 dead_letter_file="dead_letters.jsonl",
+                 delivery_metrics_file=None):
+        """Initialize notification engine with storage and API info.
+        
+        Sent notifications are recorded in notification_log; notification_file
+        is the old JSON history, imported once when the log is first created.
+        If delivery_metrics_file is set, the running engine writes its
+        delivery metrics there at every resync, so processes that do not run
+        the scheduler can report them.
+        """
         self.storage = storage_instance
         self.llm_api_url = llm_api_url
         self.notification_file = notification_file
+        self.delivery_metrics_file = delivery_metrics_file
+        self.ledger = NotificationLedger(notification_log, legacy_file=notification_file)
         self.model_name = "mistral"
-        self.notification_schedules = {}  # Track scheduled notifications
         self.running = False
         self.notification_handlers = []  # Callbacks for notifications
         
-        # Create notification file if it doesn't exist
-        if not os.path.exists(notification_file):
-            with open(notification_file, 'w') as f:
-                json.dump([], f)
+        # Handlers run on their own queues and workers, never on the scheduler thread
+        self.delivery = DeliveryDispatcher(dead_letter_file=dead_letter_file)
+        
+        # Reminder text is generated ahead of time, text_lead_hours before sending
+        self.reminder_text = ReminderTextCache(llm_api_url, model_name=self.model_name)
+        self.text_lead_hours = 6
+        # Reminders due right away wait this long for their text, then fall back to the template
+        self.immediate_text_seconds = 60
+        
+        # Reminder heap of (time, deadline_id, hours_before, generation, action),
+        # where action is "prepare" (generate text) or "send"
+        self.thresholds = list(REMINDER_THRESHOLDS)
+        self._heap = []
+        self._planned = {}  # Deadline ID -> (Deadline, generation of its heap entries)
+        self._generations = itertools.count()
+        self._condition = threading.Condition()
+        self.resync_seconds = None
+        self.scheduler_thread = None
+        self._run_id = 0  # Bumped by start() and stop(), a scheduler thread exits once it changes
+        self._listening = False  # Registered with storage; survives stop() and start()
     
-    def add_notification_handler(self, handler: Callable[[Dict[str, Any]], None]):
-        """Add a callback function to handle notifications."""
+    def add_notification_handler(self, handler: Callable[[Dict[str, Any]], None], **options):
+        """Add a callback function to handle notifications.
+        
+        Options (name, timeout, max_retries, backoff_seconds, workers) set the
+        handler's delivery policy, see DeliveryDispatcher.add_handler.
+        """
         self.notification_handlers.append(handler)
+        self.delivery.add_handler(handler, **options)
+    
+    def get_delivery_metrics(self) -> Dict[str, Dict[str, Any]]:
+        """Per-handler delivery throughput, latency and failure counts.
+        
+        When this engine is not running, another process's published metrics
+        are returned if there is a delivery_metrics_file.
+        """
+        if self.running or not self.delivery_metrics_file:
+            return self.delivery.get_metrics()
+        try:
+            with open(self.delivery_metrics_file, 'r') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return self.delivery.get_metrics()
     
-    def start(self, check_interval_minutes=15):
-        """Start the notification scheduler."""
+    def start(self, check_interval_minutes=None):
+        """Start the notification scheduler.
+        
+        Storage is scanned once to build the reminder heap; after that the
+        scheduler is driven by storage change events and sleeps until the next
+        reminder is due. Writes made by other processes raise no events here,
+        so if check_interval_minutes is set the scheduler also asks storage
+        to refresh() that often, which costs a stat() per file.
+        """
         if self.running:
             return
         
-        self.running = True
+        # A scheduler stop() gave up waiting for must be gone before a new one starts
+        self._join_scheduler()
+        with self._condition:
+            self.running = True
+            self._run_id += 1
+        self.resync_seconds = check_interval_minutes * 60 if check_interval_minutes else None
+        
+        # Another process may have been sending reminders until now
+        self.ledger.reload()
+        self.reminder_text.start()
+        self.delivery.start()
         
-        # Schedule regular checks
-        schedule.every(check_interval_minutes).minutes.do(self.check_upcoming_deadlines)
+        # Keep the heap in sync with storage instead of polling it
+        if not self._listening:
+            self.storage.add_change_listener(self._on_storage_change)
+            self._listening = True
+        self.check_upcoming_deadlines()
         
         # Start the scheduler in a background thread
-        self.scheduler_thread = threading.Thread(target=self._run_scheduler)
+        self.scheduler_thread = threading.Thread(target=self._run_scheduler, args=(self._run_id,))
         self.scheduler_thread.daemon = True
         self.scheduler_thread.start()
         
-        print(f"Notification engine started, checking every {check_interval_minutes} minutes")
+        print("Notification engine started")
     
     def stop(self):
         """Stop the notification scheduler."""
-        self.running = False
-        schedule.clear()
+        with self._condition:
+            self.running = False
+            self._run_id += 1
+            self._condition.notify_all()
+        self._join_scheduler()
+        self.reminder_text.stop()
+        self.delivery.stop()
         print("Notification engine stopped")
     
-    def _run_scheduler(self):
-        """Run the scheduler loop."""
-        while self.running:
-            schedule.run_pending()
-            time.sleep(1)
+    def _join_scheduler(self, timeout=10.0):
+        """Wait for the scheduler thread to finish what it is sending."""
+        thread = self.scheduler_thread
+        if thread is None or thread is threading.current_thread():
+            return
+        thread.join(timeout)
+        if thread.is_alive():
+            print("Notification scheduler did not stop in time")
+    
+    def _run_scheduler(self, run_id: int):
+        """Sleep until the next reminder is due, then send every due reminder."""
+        next_resync = time.monotonic() + self.resync_seconds if self.resync_seconds else None
+        while True:
+            with self._condition:
+                while self._run_id == run_id:
+                    timeouts = []
+                    if next_resync is not None:
+                        timeouts.append(next_resync - time.monotonic())
+                    if self._heap:
+                        timeouts.append((self._heap[0][0] - datetime.datetime.now()).total_seconds())
+                    if timeouts and min(timeouts) <= 0:
+                        break
+                    self._condition.wait(timeout=min(timeouts) if timeouts else None)
+                
+                if self._run_id != run_id:
+                    return
+                due = self._pop_due_reminders()
+            
+            if next_resync is not None and time.monotonic() >= next_resync:
+                self._resync_storage()
+                self._publish_delivery_metrics()
+                next_resync = time.monotonic() + self.resync_seconds
+            
+            for deadline, threshold, action in due:
+                if action == "prepare":
+                    self.reminder_text.request(deadline, threshold)
+                else:
+                    self._send_reminder(deadline, threshold)
     
     def check_upcoming_deadlines(self):
-        """Check for upcoming deadlines and schedule notifications."""
-        print("Checking for upcoming deadlines...")
-        
-        # Get deadlines for the next 48 hours
-        upcoming = self.storage.get_upcoming_deadlines(hours_ahead=48)
-        
-        if not upcoming:
-            print("No upcoming deadlines found")
-            return
-        
-        # Process each deadline
-        for deadline in upcoming:
-            self._process_deadline_notification(deadline)
+        """Rebuild the reminder heap from a full scan of storage."""
+        records = self.storage.get_all_records()
+        with self._condition:
+            self._planned = {}
+            self._heap = []
+            for record in records:
+                self._plan_deadline(record)
+            self._condition.notify_all()
+        print(f"Planned reminders for {len(self._planned)} deadlines")
     
-    def _process_deadline_notification(self, deadline: Dict[str, Any]):
-        """Process a single deadline for notification."""
-        deadline_id = deadline.get('id')
-        
-        if not deadline_id:
-            return
-        
-        # Skip if already processed recently
-        if self._is_recently_notified(deadline_id):
-            return
-        
-        # Get the deadline datetime
-        deadline_date = self._parse_deadline_date(deadline.get('deadline'))
-        if not deadline_date:
-            return
-        
-        # Calculate time until deadline
-        now = datetime.datetime.now()
-        time_until = deadline_date - now
-        
-        # Skip if deadline has passed
-        if time_until.total_seconds() <= 0:
+    def _resync_storage(self):
+        """Replan deadlines that other processes changed in storage."""
+        refresh = getattr(self.storage, "refresh", None)
+        if refresh is None:
             return
-        
-        hours_until = time_until.total_seconds() / 3600
-        
-        # Determine when to send notifications
-        notification_times = self._get_notification_times(hours_until)
-        
-        for notification_time in notification_times:
-            self._schedule_notification(deadline, notification_time)
-    
-    def _parse_deadline_date(self, date_str: Optional[str]) -> Optional[datetime.datetime]:
-        """Parse a deadline date string into a datetime object."""
-        if not date_str:
-            return None
-            
         try:
-            return datetime.datetime.fromisoformat(date_str)
-        except (ValueError, TypeError):
-            try:
-                # Try alternative format
-                return datetime.datetime.strptime(date_str, "%Y-%m-%d %H:%M:%S")
-            except (ValueError, TypeError):
-                print(f"Could not parse deadline date: {date_str}")
-                return None
+            # Reports changes through _on_storage_change
+            refresh()
+        except Exception as e:
+            print(f"Error refreshing storage: {e}")
     
-    def _is_recently_notified(self, deadline_id: str) -> bool:
-        """Check if a notification was recently sent for this deadline."""
+    def _publish_delivery_metrics(self):
+        """Share delivery metrics with processes that do not run the scheduler."""
+        if not self.delivery_metrics_file:
+            return
+        directory = os.path.dirname(os.path.abspath(self.delivery_metrics_file))
         try:
-            # Load existing notifications
-            with open(self.notification_file, 'r') as f:
-                notifications = json.load(f)
-            
-            # Check for recent notifications for this deadline
-            now = datetime.datetime.now()
-            for notification in notifications:
-                if notification.get('deadline_id') == deadline_id:
-                    # Check if notification was sent in the last hour
-                    notification_time = datetime.datetime.fromisoformat(notification.get('timestamp'))
-                    if (now - notification_time).total_seconds() < 3600:
-                        return True
-                        
-            return False
-        except (json.JSONDecodeError, FileNotFoundError, KeyError) as e:
-            print(f"Error checking recent notifications: {e}")
-            return False
+            fd, tmp_path = tempfile.mkstemp(prefix=".delivery_", suffix=".tmp", dir=directory)
+            with os.fdopen(fd, 'w') as f:
+                json.dump(self.delivery.get_metrics(), f)
+            os.replace(tmp_path, self.delivery_metrics_file)
+        except OSError as e:
+            print(f"Error publishing delivery metrics: {e}")
     
-    def _get_notification_times(self, hours_until: float) -> List[float]:
-        """Determine appropriate notification times based on time until deadline."""
-        notification_times = []
-        
-        # Notification thresholds in hours
-        thresholds = [1, 3, 24, 48]
-        
-        for threshold in thresholds:
-            # If deadline is beyond this threshold, notify at this point
-            if hours_until > threshold and hours_until - threshold < 1:
-                notification_times.append(threshold)
-        
-        # If very close to deadline (< 1 hour), notify immediately
-        if 0 < hours_until < 1:
-            notification_times.append(0)  # 0 means immediately
-        
-        return notification_times
+    def _on_storage_change(self, changed: List[Deadline], removed_ids: List[str]):
+        """Re-plan reminders for deadlines that were written or removed.
+        
+        Called by storage while it holds its lock, so this must stay cheap and
+        must not call back into storage.
+        """
+        with self._condition:
+            # A stopped engine rebuilds its heap from storage on start()
+            if not self.running:
+                return
+            for deadline_id in removed_ids:
+                self._planned.pop(deadline_id, None)
+                self.reminder_text.discard(deadline_id)
+            for record in changed:
+                self._plan_deadline(record)
+            
+            # Replanning leaves stale entries behind, drop them once they dominate
+            if len(self._heap) > 2 * REMINDERS_PER_DEADLINE * max(len(self._planned), 1):
+                self._heap = [entry for entry in self._heap
+                              if self._planned.get(entry[1], (None, None))[1] == entry[3]]
+                heapq.heapify(self._heap)
+            
+            self._condition.notify_all()
     
-    def _schedule_notification(self, deadline: Dict[str, Any], hours_before: float):
-        """Schedule a notification for a deadline."""
-        deadline_id = deadline.get('id')
-        
-        # If immediate notification
-        if hours_before == 0:
-            self._send_notification(deadline)
+    def _plan_deadline(self, deadline: Deadline):
+        """Push the future reminders of a deadline onto the heap. Caller must hold the condition."""
+        if not deadline.id:
             return
         
-        # Calculate notification time
-        deadline_date = self._parse_deadline_date(deadline.get('deadline'))
-        if not deadline_date:
-            return
-            
-        notification_time = deadline_date - datetime.timedelta(hours=hours_before)
+        # A new generation invalidates any reminders planned for an older version
+        generation = next(self._generations)
+        self._planned[deadline.id] = (deadline, generation)
         
-        # Skip if notification time has passed
-        if notification_time < datetime.datetime.now():
+        if not deadline.due:
             return
         
-        # Create a unique key for this notification
-        notification_key = f"{deadline_id}_{hours_before}"
-        
-        # Skip if already scheduled
-        if notification_key in self.notification_schedules:
+        now = datetime.datetime.now()
+        if deadline.due <= now:
             return
         
-        # Schedule the notification
-        job = schedule.every().day.at(notification_time.strftime("%H:%M")).do(
-            self._send_notification, deadline, hours_before
-        )
-        
-        self.notification_schedules[notification_key] = job
-        print(f"Scheduled notification for '{deadline.get('task')}' at {notification_time}")
+        planned_any = False
+        for threshold in self.thresholds:
+            fire_time = deadline.due - datetime.timedelta(hours=threshold)
+            if fire_time <= now:
+                continue
+            heapq.heappush(self._heap, (fire_time, deadline.id, threshold, generation, "send"))
+            planned_any = True
+            
+            # Have the text ready by the time the reminder fires
+            prepare_time = fire_time - datetime.timedelta(hours=self.text_lead_hours)
+            if prepare_time <= now:
+                self.reminder_text.request(deadline, threshold)
+            else:
+                heapq.heappush(self._heap, (prepare_time, deadline.id, threshold, generation, "prepare"))
+        
+        # Inside the last threshold already: remind right away, unless a
+        # reminder for this due date went out before (e.g. before a restart)
+        if (not planned_any and deadline.due - now < datetime.timedelta(hours=min(self.thresholds))
+                and not self.ledger.was_any_sent(deadline.id, deadline.deadline)):
+            self.reminder_text.request(deadline, 0)
+            send_time = min(now + datetime.timedelta(seconds=self.immediate_text_seconds), deadline.due)
+            heapq.heappush(self._heap, (send_time, deadline.id, 0, generation, "send"))
     
-    def _send_notification(self, deadline: Dict[str, Any], hours_before: Optional[float] = None):
+    def _pop_due_reminders(self) -> List[Any]:
+        """Pop every valid reminder that is due. Caller must hold the condition."""
+        now = datetime.datetime.now()
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            _, deadline_id, threshold, generation, action = heapq.heappop(self._heap)
+            planned = self._planned.get(deadline_id)
+            if planned and planned[1] == generation:
+                due.append((planned[0], threshold, action))
+        return due
+    
+    def _send_reminder(self, deadline: Deadline, threshold: float):
+        """Send one reminder unless it already went out for this due date."""
+        if self.ledger.was_sent(deadline.id, threshold, deadline.deadline):
+            return
+        self._send_notification(deadline, threshold)
+    
+    def _send_notification(self, deadline: Deadline, hours_before: Optional[float] = None):
         """Generate and send a notification for a deadline."""
         notification_content = self._generate_notification_content(deadline, hours_before)
         
         # Record that we've sent a notification
-        self._record_notification(deadline.get('id'), notification_content)
-        
-        # Call notification handlers
-        for handler in self.notification_handlers:
-            try:
-                handler(notification_content)
-            except Exception as e:
-                print(f"Error in notification handler: {e}")
+        self.ledger.record(notification_content, hours_before, deadline.deadline)
+        self.reminder_text.discard(deadline.id, hours_before)
         
-        print(f"Notification sent for: {deadline.get('task')}")
+        # Hand off to the delivery queues
+        self.delivery.deliver(notification_content)
         
-        # Remove from schedule if it exists
-        if hours_before is not None:
-            notification_key = f"{deadline.get('id')}_{hours_before}"
-            if notification_key in self.notification_schedules:
-                schedule.cancel_job(self.notification_schedules[notification_key])
-                del self.notification_schedules[notification_key]
+        print(f"Notification queued for: {deadline.task}")
     
-    def _generate_notification_content(self, deadline: Dict[str, Any], hours_before: Optional[float] = None) -> Dict[str, Any]:
-        """Generate the content for a notification using the LLM."""
-        task = deadline.get('task', 'Unknown task')
-        deadline_date = self._parse_deadline_date(deadline.get('deadline'))
-        deadline_str = deadline_date.strftime("%Y-%m-%d %H:%M") if deadline_date else "Unknown time"
-        details = deadline.get('details', '')
+    def _generate_notification_content(self, deadline: Deadline, hours_before: Optional[float] = None) -> Dict[str, Any]:
+        """Build the content for a notification from pre-generated LLM text.
         
-        # Time context
-        time_context = "approaching soon"
-        if hours_before is not None:
-            if hours_before == 1:
-                time_context = "in 1 hour"
-            elif hours_before == 3:
-                time_context = "in 3 hours"
-            elif hours_before == 24:
-                time_context = "in 1 day"
-            elif hours_before == 48:
-                time_context = "in 2 days"
+        Falls back to a template if the text is not ready; the LLM is never
+        called on the delivery path.
+        """
+        task = deadline.task or 'Unknown task'
+        deadline_str = format_deadline_date(deadline)
+        details = deadline.details or ''
+        time_context = describe_time_context(hours_before)
         
-        # Try to use LLM for personalized message
-        llm_content = self._get_llm_notification(task, deadline_str, time_context, details)
+        llm_content = self.reminder_text.get(deadline, hours_before)
         
-        if llm_content and 'subject' in llm_content and 'body' in llm_content:
+        if llm_content:
             notification = {
                 'id': f"notif_{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}",
-                'deadline_id': deadline.get('id'),
+                'deadline_id': deadline.id,
                 'task': task,
                 'deadline_date': deadline_str,
                 'time_context': time_context,
@@ -255,85 +329,13 @@ class NotificationEngine:
             # Fallback to template
             notification = {
                 'id': f"notif_{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}",
-                'deadline_id': deadline.get('id'),
+                'deadline_id': deadline.id,
                 'task': task,
                 'deadline_date': deadline_str,
                 'time_context': time_context,
                 'subject': f"REMINDER: {task} due {time_context}",
-                'body': f"This is a reminder that '{task}' is due {time_context} ({deadline_str}).\n\n{details}"
+                'body': f"This is a reminder that '{task}' is due {time_context} ({deadline_str}).\n\n{details}",
+                'timestamp': datetime.datetime.now().isoformat()
             }
         
         return notification
-    
-    def _get_llm_notification(self, task: str, deadline_str: str, time_context: str, details: str) -> Optional[Dict[str, str]]:
-        """Generate a personalized notification using the LLM API."""
-        try:
-            prompt = f"""
-            Generate a friendly reminder notification for the following task:
-            Task: {task}
-            Deadline: {deadline_str}
-            Time until deadline: {time_context}
-            Additional details: {details}
-            
-            Please generate a JSON with 'subject' and 'body' fields for the notification.
-            Keep the subject under 80 characters and the body concise but informative.
-            The tone should be professional but friendly.
-            """
-            
-            payload = {
-                "model": self.model_name,
-                "prompt": prompt,
-                "temperature": 0.7,
-                "max_tokens": 200
-            }
-            
-            response = requests.post(self.llm_api_url, json=payload, timeout=5)
-            
-            if response.status_code == 200:
-                result = response.json()
-                # Extract the generated text from the API response
-                generated_text = result.get('response', '')
-                
-                # Try to parse as JSON
-                try:
-                    # Find JSON in the response if it's embedded
-                    import re
-                    json_match = re.search(r'\{.*\}', generated_text, re.DOTALL)
-                    if json_match:
-                        json_str = json_match.group(0)
-                        content = json.loads(json_str)
-                        
-                        # Ensure required fields exist
-                        if 'subject' in content and 'body' in content:
-                            return content
-                except (json.JSONDecodeError, AttributeError):
-                    print("Failed to parse LLM response as JSON")
-            
-            return None
-        except Exception as e:
-            print(f"Error generating LLM notification: {e}")
-            return None
-    
-    def _record_notification(self, deadline_id: str, notification: Dict[str, Any]):
-        """Record a sent notification to the notifications file."""
-        try:
-            # Load existing notifications
-            with open(self.notification_file, 'r') as f:
-                notifications = json.load(f)
-            
-            # Add new notification
-            notifications.append(notification)
-            
-            # Trim to last 100 notifications to prevent file growth
-            if len(notifications) > 100:
-                notifications = notifications[-100:]
-            
-            # Save updated notifications
-            with open(self.notification_file, 'w') as f:
-                json.dump(notifications, f, indent=2)
-                
-        except (json.JSONDecodeError, FileNotFoundError) as e:
-            print(f"Error recording notification: {e}")
-            # Create new file with just this notification
-            with open(self.notification_file, 'w') as f:
-                json.dump([notification], f, indent=2)
\ No newline at end of file
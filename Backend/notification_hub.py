@@ -0,0 +1,208 @@
+import os
+import json
+import queue
+import tempfile
+import threading
+from collections import deque
+from typing import Dict, Any, Optional, List
+from file_lock import FileLock
+
+class Subscription:
+    def __init__(self, queue_size: int):
+        """A single client's bounded queue of pending events."""
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.dropped = 0  # Events discarded because the client fell behind
+
+    def put(self, event: Dict[str, Any]):
+        """Queue an event, dropping the oldest one if the client is too slow."""
+        while True:
+            try:
+                self.queue.put_nowait(event)
+                return
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Wait for the next event, returns None on timeout."""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+class NotificationHub:
+    def __init__(self, queue_size=100, history_size=1000):
+        """Fan notifications out to connected clients.
+
+        Each subscriber gets its own queue of at most queue_size events, and
+        the last history_size events are kept so reconnecting clients can
+        resume from their last event ID.
+        """
+        self.queue_size = queue_size
+        self.lock = threading.Lock()
+        self.subscribers = set()
+        self.history = deque(maxlen=history_size)
+        self.last_event_id = 0
+
+    def publish(self, notification: Dict[str, Any], event_id: Optional[int] = None) -> int:
+        """Send a notification to every subscriber, returns its event ID.
+
+        event_id is assigned here unless given, e.g. by an EventLog shared
+        with other processes.
+        """
+        with self.lock:
+            if event_id is None:
+                event_id = self.last_event_id + 1
+            self.last_event_id = max(self.last_event_id, event_id)
+            event = {"id": event_id, "data": notification}
+            self.history.append(event)
+            subscribers = list(self.subscribers)
+
+        for subscription in subscribers:
+            subscription.put(event)
+        return event["id"]
+
+    def subscribe(self, last_event_id: Optional[int] = None) -> Subscription:
+        """Register a client, replaying events after last_event_id if given."""
+        subscription = Subscription(self.queue_size)
+        with self.lock:
+            # Replay and register under one lock so no event is missed or doubled
+            if last_event_id is not None:
+                for event in self.history:
+                    if event["id"] > last_event_id:
+                        subscription.put(event)
+            self.subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        """Remove a client."""
+        with self.lock:
+            self.subscribers.discard(subscription)
+
+    def subscriber_count(self) -> int:
+        """Number of connected clients."""
+        with self.lock:
+            return len(self.subscribers)
+
+class EventLog:
+    def __init__(self, log_file="notification_events.jsonl", max_log_bytes=1024 * 1024,
+                 keep_events=1000, poll_seconds=0.5):
+        """Relay notifications between processes through a shared JSON-lines file.
+
+        Whichever process sends notifications appends them with the next
+        event ID; every process follows the file and publishes new events to
+        its own hub under the same ID, so a client can connect to, and
+        resume from, any worker. Once the file grows past max_log_bytes it
+        is rewritten with only the last keep_events events.
+        """
+        self.log_file = log_file
+        self.max_log_bytes = max_log_bytes
+        self.keep_events = keep_events
+        self.poll_seconds = poll_seconds
+        self.lock = threading.Lock()
+        self._file_lock = FileLock(log_file + ".lock")
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def append(self, notification: Dict[str, Any]) -> int:
+        """Add a notification to the log, returns its event ID."""
+        with self.lock, self._file_lock:
+            # The last writer may have been another process, so ask the file
+            event_id = self._last_event_id() + 1
+            line = json.dumps({"id": event_id, "data": notification}, separators=(',', ':'), default=str)
+            with open(self.log_file, 'a') as f:
+                f.write(line + "\n")
+            if os.path.getsize(self.log_file) > self.max_log_bytes:
+                self._compact()
+        return event_id
+
+    def start(self, hub: NotificationHub):
+        """Follow the log in the background, publishing events to hub.
+
+        Events already in the log fill the hub's history, so clients can
+        resume across a restart.
+        """
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._follow, args=(hub,), name="event-log")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stop following the log."""
+        self._stopped.set()
+
+    def _follow(self, hub: NotificationHub):
+        inode = None
+        offset = 0
+        partial = b""
+        last_id = 0
+        while not self._stopped.is_set():
+            try:
+                st = os.stat(self.log_file)
+            except FileNotFoundError:
+                st = None
+
+            if st is not None:
+                if st.st_ino != inode or st.st_size < offset:
+                    # Compacted (or replaced): start over, skipping what we have seen
+                    inode, offset, partial = st.st_ino, 0, b""
+                if st.st_size > offset:
+                    with open(self.log_file, 'rb') as f:
+                        f.seek(offset)
+                        data = f.read()
+                    offset += len(data)
+                    lines = (partial + data).split(b"\n")
+                    partial = lines.pop()
+                    for event in self._parse(lines):
+                        if event["id"] > last_id:
+                            last_id = event["id"]
+                            hub.publish(event["data"], event_id=event["id"])
+
+            self._stopped.wait(self.poll_seconds)
+
+    def _last_event_id(self) -> int:
+        """ID of the last complete event in the file. Caller must hold the file lock."""
+        try:
+            with open(self.log_file, 'rb') as f:
+                f.seek(0, os.SEEK_END)
+                f.seek(max(0, f.tell() - 65536))
+                tail = f.read().split(b"\n")
+        except FileNotFoundError:
+            return 0
+        events = self._parse(tail)
+        return events[-1]["id"] if events else 0
+
+    def _compact(self):
+        """Rewrite the log with only its most recent events. Caller must hold the file lock."""
+        with open(self.log_file, 'rb') as f:
+            events = self._parse(f.read().split(b"\n"))[-self.keep_events:]
+        directory = os.path.dirname(os.path.abspath(self.log_file))
+        fd, tmp_path = tempfile.mkstemp(prefix=".events_", suffix=".tmp", dir=directory)
+        with os.fdopen(fd, 'w') as f:
+            for event in events:
+                f.write(json.dumps(event, separators=(',', ':'), default=str) + "\n")
+        os.replace(tmp_path, self.log_file)
+
+    def _parse(self, lines: List[bytes]) -> List[Dict[str, Any]]:
+        """Decode event lines, skipping partial or damaged ones."""
+        events = []
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                event = json.loads(line)
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                continue
+            if isinstance(event, dict) and isinstance(event.get("id"), int):
+                events.append(event)
+        return events
+
+def format_sse(event: Dict[str, Any]) -> str:
+    """Format a hub event as a Server-Sent Events message."""
+    data = json.dumps(event["data"], separators=(',', ':'))
+    return f"id: {event['id']}\nevent: notification\ndata: {data}\n\n"
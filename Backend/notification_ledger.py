@@ -0,0 +1,153 @@
+import os
+import re
+import json
+import threading
+from typing import Dict, Any, List, Optional
+from file_lock import FileLock
+
+class NotificationLedger:
+    def __init__(self, log_file="notifications.log", max_log_bytes=1024 * 1024, legacy_file=None):
+        """Record sent notifications in an append-only log with an in-memory index.
+
+        The log is a JSON-lines file. When it grows past max_log_bytes it is
+        renamed to log_file.N and a new one is started; rotated segments are
+        kept, so the full history stays available without rewriting it.
+        Notifications from a legacy JSON array file (the old
+        notifications.json) are imported the first time the log is created.
+        """
+        self.log_file = log_file
+        self.max_log_bytes = max_log_bytes
+        self.lock = threading.Lock()
+        self._sent = {}  # (deadline_id, hours_before) -> latest entry
+        self._thresholds = {}  # deadline_id -> hours_before values with an entry
+        self._count = 0
+
+        # Every worker process opens the ledger, only one may import
+        with FileLock(log_file + ".lock"):
+            if not os.path.exists(log_file) and not self._segments():
+                self._import_legacy(legacy_file)
+
+        self.reload()
+
+    def reload(self):
+        """Rebuild the index from the log, e.g. after another process appended to it."""
+        with self.lock:
+            self._sent = {}
+            self._thresholds = {}
+            self._count = 0
+            for path in self._segments() + [self.log_file]:
+                for entry in self._read_log(path):
+                    self._index(entry)
+
+    def was_sent(self, deadline_id: str, hours_before: Optional[float], due: Optional[str] = None) -> bool:
+        """Check if the reminder for a deadline and threshold already went out.
+
+        If due is given, a reminder sent for a different due date (the
+        deadline was moved) does not count.
+        """
+        with self.lock:
+            entry = self._sent.get((deadline_id, hours_before))
+        if entry is None:
+            return False
+        return due is None or entry.get("deadline_due") == due
+    
+    def was_any_sent(self, deadline_id: str, due: Optional[str] = None) -> bool:
+        """Check if any reminder for a deadline went out, at whatever threshold.
+        
+        As with was_sent, a given due date only matches reminders sent for it.
+        """
+        with self.lock:
+            entries = [self._sent[(deadline_id, hours_before)]
+                       for hours_before in self._thresholds.get(deadline_id, ())]
+        return any(due is None or entry.get("deadline_due") == due for entry in entries)
+
+    def record(self, notification: Dict[str, Any], hours_before: Optional[float], due: Optional[str] = None):
+        """Append a sent notification to the log."""
+        entry = dict(notification)
+        entry["hours_before"] = hours_before
+        entry["deadline_due"] = due
+        line = json.dumps(entry, separators=(',', ':')) + "\n"
+
+        with self.lock:
+            try:
+                with open(self.log_file, 'a') as f:
+                    f.write(line)
+                self._rotate_if_needed()
+            except OSError as e:
+                print(f"Error recording notification: {e}")
+            self._index(entry)
+
+    def history(self, deadline_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Read the full notification history, optionally for one deadline, oldest first."""
+        with self.lock:
+            paths = self._segments() + [self.log_file]
+        entries = []
+        for path in paths:
+            for entry in self._read_log(path):
+                if deadline_id is None or entry.get("deadline_id") == deadline_id:
+                    entries.append(entry)
+        return entries
+
+    def __len__(self):
+        return self._count
+
+    def _index(self, entry: Dict[str, Any]):
+        """Add a log entry to the in-memory index."""
+        key = (entry.get("deadline_id"), entry.get("hours_before"))
+        self._sent[key] = entry
+        self._thresholds.setdefault(key[0], set()).add(key[1])
+        self._count += 1
+
+    def _rotate_if_needed(self):
+        """Start a new log segment once the current one is too big. Caller must hold the lock."""
+        if os.path.getsize(self.log_file) < self.max_log_bytes:
+            return
+        segments = self._segments()
+        next_number = int(segments[-1].rsplit('.', 1)[1]) + 1 if segments else 1
+        os.replace(self.log_file, f"{self.log_file}.{next_number}")
+
+    def _segments(self) -> List[str]:
+        """Rotated log segments, oldest first."""
+        directory = os.path.dirname(os.path.abspath(self.log_file))
+        base = os.path.basename(self.log_file)
+        pattern = re.compile(re.escape(base) + r'\.(\d+)$')
+        numbered = []
+        for name in os.listdir(directory):
+            match = pattern.match(name)
+            if match:
+                numbered.append((int(match.group(1)), os.path.join(directory, name)))
+        return [path for _, path in sorted(numbered)]
+
+    def _read_log(self, path: str) -> List[Dict[str, Any]]:
+        """Read entries from one log segment, skipping damaged lines."""
+        entries = []
+        try:
+            with open(path, 'r') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        entries.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        # A crash can leave a partial last line
+                        continue
+        except FileNotFoundError:
+            pass
+        return entries
+
+    def _import_legacy(self, legacy_file: Optional[str]):
+        """Copy notifications from the old JSON array file into a new log."""
+        if not legacy_file or not os.path.exists(legacy_file):
+            return
+        try:
+            with open(legacy_file, 'r') as f:
+                notifications = json.load(f)
+        except (json.JSONDecodeError, OSError) as e:
+            print(f"Error importing notifications from {legacy_file}: {e}")
+            return
+
+        with open(self.log_file, 'a') as f:
+            for notification in notifications:
+                if isinstance(notification, dict):
+                    f.write(json.dumps(notification, separators=(',', ':')) + "\n")
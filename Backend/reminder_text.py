@@ -0,0 +1,190 @@
+import re
+import json
+import queue
+import threading
+import requests
+from typing import Dict, Any, List, Optional, Tuple
+from deadline_record import Deadline
+import metrics
+
+def describe_time_context(hours_before: Optional[float]) -> str:
+    """Describe how far off a deadline is for a reminder sent hours_before it."""
+    if hours_before == 1:
+        return "in 1 hour"
+    elif hours_before == 3:
+        return "in 3 hours"
+    elif hours_before == 24:
+        return "in 1 day"
+    elif hours_before == 48:
+        return "in 2 days"
+    return "approaching soon"
+
+def format_deadline_date(deadline: Deadline) -> str:
+    """Format a deadline's due date for reminder text."""
+    return deadline.due.strftime("%Y-%m-%d %H:%M") if deadline.due else "Unknown time"
+
+class ReminderTextCache:
+    def __init__(self, llm_api_url="http://localhost:11434/api/generate", model_name="mistral",
+                 batch_size=8, batch_wait_seconds=2.0, timeout=120):
+        """Generate reminder text with the LLM ahead of time, in batches.
+
+        Reminders are requested when they are scheduled. A background worker
+        collects up to batch_size requests (waiting at most
+        batch_wait_seconds for a batch to fill) and asks the LLM for all of
+        them in one prompt. At send time the text is a cache lookup.
+        """
+        self.llm_api_url = llm_api_url
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.batch_wait_seconds = batch_wait_seconds
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self._texts = {}  # (deadline_id, hours_before) -> (fingerprint, {"subject", "body"})
+        self._pending = set()  # (deadline_id, hours_before, fingerprint) waiting for the LLM
+        self._queue = queue.Queue()
+        self.running = False
+
+    def start(self):
+        """Start the background generation worker."""
+        if self.running:
+            return
+        self.running = True
+        self.worker_thread = threading.Thread(target=self._run_worker)
+        self.worker_thread.daemon = True
+        self.worker_thread.start()
+
+    def stop(self):
+        """Stop the background generation worker."""
+        self.running = False
+        self._queue.put(None)
+
+    def request(self, deadline: Deadline, hours_before: Optional[float]):
+        """Queue generation of a reminder's text unless it is cached or pending.
+
+        Only does a set lookup and a queue put, so it is safe to call while
+        holding scheduler locks. Does nothing while the cache is stopped.
+        """
+        if not self.running:
+            return
+        key = (deadline.id, hours_before)
+        fingerprint = self._fingerprint(deadline)
+        with self.lock:
+            cached = self._texts.get(key)
+            if cached and cached[0] == fingerprint:
+                return
+            if key + (fingerprint,) in self._pending:
+                return
+            self._pending.add(key + (fingerprint,))
+        self._queue.put((deadline, hours_before, fingerprint))
+
+    def get(self, deadline: Deadline, hours_before: Optional[float]) -> Optional[Dict[str, str]]:
+        """Get generated text for a reminder, or None if it is not ready."""
+        with self.lock:
+            cached = self._texts.get((deadline.id, hours_before))
+        if cached and cached[0] == self._fingerprint(deadline):
+            return cached[1]
+        return None
+
+    def discard(self, deadline_id: str, hours_before: Optional[float] = None):
+        """Drop cached text for one reminder, or for all reminders of a deadline."""
+        with self.lock:
+            if hours_before is not None:
+                self._texts.pop((deadline_id, hours_before), None)
+                return
+            for key in [key for key in self._texts if key[0] == deadline_id]:
+                del self._texts[key]
+
+    def _run_worker(self):
+        """Collect requests into batches and generate their text."""
+        while self.running:
+            item = self._queue.get()
+            if item is None:
+                continue
+            batch = [item]
+
+            # Give other reminders scheduled at about the same time a chance to join
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get(timeout=self.batch_wait_seconds)
+                except queue.Empty:
+                    break
+                if item is None:
+                    break
+                batch.append(item)
+
+            texts = self._generate_batch(batch)
+
+            with self.lock:
+                for (deadline, hours_before, fingerprint), text in zip(batch, texts):
+                    key = (deadline.id, hours_before)
+                    self._pending.discard(key + (fingerprint,))
+                    if text:
+                        self._texts[key] = (fingerprint, text)
+
+    def _generate_batch(self, batch: List[Tuple[Deadline, Optional[float], Any]]) -> List[Optional[Dict[str, str]]]:
+        """Ask the LLM for the text of several reminders in one call."""
+        texts = [None] * len(batch)
+        items = []
+        for index, (deadline, hours_before, _) in enumerate(batch, start=1):
+            items.append(
+                f"{index}. Task: {deadline.task or 'Unknown task'}\n"
+                f"   Deadline: {format_deadline_date(deadline)}\n"
+                f"   Time until deadline: {describe_time_context(hours_before)}\n"
+                f"   Additional details: {deadline.details or ''}"
+            )
+
+        prompt = f"""
+        Generate a friendly reminder notification for each of the following tasks:
+
+        {chr(10).join(items)}
+
+        Respond with a JSON array containing one object per task, with an
+        'index' field (the task number) and 'subject' and 'body' fields.
+        Keep each subject under 80 characters and each body concise but informative.
+        The tone should be professional but friendly.
+        Response should be valid JSON only, with no explanations or other text.
+        """
+
+        metrics.LLM_PROMPT_CHARS.observe(len(prompt), purpose="reminder")
+        try:
+            with metrics.LLM_REQUEST_SECONDS.time(purpose="reminder"):
+                response = requests.post(self.llm_api_url, json={
+                    "model": self.model_name,
+                    "prompt": prompt,
+                    "stream": False,
+                    "options": {"temperature": 0.7}
+                }, timeout=self.timeout)
+
+            if response.status_code != 200:
+                print(f"API error: {response.status_code}")
+                metrics.LLM_ERRORS.inc(purpose="reminder")
+                return texts
+
+            result = response.json()
+            metrics.record_llm_usage("reminder", result)
+            generated_text = result.get('response', '')
+            json_match = re.search(r'\[.*\]', generated_text, re.DOTALL)
+            if not json_match:
+                print("Failed to find reminder texts in LLM response")
+                metrics.LLM_PARSE_FAILURES.inc(purpose="reminder")
+                return texts
+
+            for position, content in enumerate(json.loads(json_match.group(0))):
+                if not isinstance(content, dict) or 'subject' not in content or 'body' not in content:
+                    continue
+                # Trust the index if the model gave one, otherwise the position
+                index = content.get('index', position + 1)
+                if isinstance(index, int) and 1 <= index <= len(batch):
+                    texts[index - 1] = {'subject': str(content['subject']), 'body': str(content['body'])}
+        except json.JSONDecodeError:
+            print("Failed to parse LLM response as JSON")
+            metrics.LLM_PARSE_FAILURES.inc(purpose="reminder")
+        except Exception as e:
+            print(f"Error generating reminder texts: {e}")
+            metrics.LLM_ERRORS.inc(purpose="reminder")
+
+        return texts
+
+    def _fingerprint(self, deadline: Deadline) -> Tuple[Any, ...]:
+        """The deadline fields the text depends on."""
+        return (deadline.task, deadline.deadline, deadline.details)
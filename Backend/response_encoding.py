@@ -0,0 +1,140 @@
+import gzip
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+import metrics
+
+try:
+    import brotli
+except ImportError:  # br is only offered when brotli is installed
+    brotli = None
+
+try:
+    import msgpack
+except ImportError:  # MessagePack is only offered when msgpack is installed
+    msgpack = None
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+
+# Bodies smaller than this are sent uncompressed; compression would barely help
+MIN_COMPRESS_BYTES = 1024
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+# Short forms used in ETags, so each representation gets its own
+_ETAG_SUFFIXES = {MSGPACK: "mp", "gzip": "gz", "br": "br"}
+
+def media_types():
+    """Media types the server can produce, preferred first."""
+    return [JSON, MSGPACK, "application/x-msgpack"] if msgpack is not None else [JSON]
+
+def content_encodings():
+    """Content codings the server can apply, preferred first."""
+    return ["br", "gzip"] if brotli is not None else ["gzip"]
+
+def negotiate(accept_mimetypes, accept_encodings) -> Tuple[str, Optional[str]]:
+    """Pick (media type, content coding) from parsed Accept and Accept-Encoding headers.
+
+    Both take werkzeug Accept objects (request.accept_mimetypes and
+    request.accept_encodings). JSON is the fallback when the client
+    accepts nothing the server can produce, and no coding is applied
+    unless the client asks for one.
+    """
+    media_type = accept_mimetypes.best_match(media_types(), default=JSON)
+    if media_type == "application/x-msgpack":
+        media_type = MSGPACK
+    encoding = accept_encodings.best_match(content_encodings())
+    return media_type, encoding
+
+def variant_etag(etag: str, media_type: str, encoding: Optional[str]) -> str:
+    """Make an ETag distinct per representation; plain JSON keeps the bare ETag."""
+    for part in (media_type, encoding):
+        suffix = _ETAG_SUFFIXES.get(part)
+        if suffix:
+            etag = f"{etag}-{suffix}"
+    return etag
+
+def serialize(data: Any, media_type: str) -> bytes:
+    """Serialize data as compact JSON or MessagePack."""
+    if media_type == MSGPACK:
+        return msgpack.packb(data, use_bin_type=True, default=str)
+    return json.dumps(data, separators=(',', ':'), default=str).encode('utf-8')
+
+def compress(body: bytes, encoding: Optional[str]) -> Tuple[bytes, Optional[str]]:
+    """Apply a content coding, returns (body, coding actually applied).
+
+    Small bodies are returned as is, with None as the coding.
+    """
+    if encoding is None or len(body) < MIN_COMPRESS_BYTES:
+        return body, None
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY), "br"
+    if encoding == "gzip":
+        # Fixed mtime so the same body always compresses to the same bytes
+        return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0), "gzip"
+    return body, None
+
+class EncodedBody:
+    __slots__ = ("body", "media_type", "encoding", "headers")
+
+    def __init__(self, body: bytes, media_type: str, encoding: Optional[str],
+                 headers: Optional[Dict[str, str]] = None):
+        """A serialized, possibly compressed response body and its extra headers."""
+        self.body = body
+        self.media_type = media_type
+        self.encoding = encoding
+        self.headers = headers or {}
+
+def encode(data: Any, media_type: str, encoding: Optional[str],
+           headers: Optional[Dict[str, str]] = None) -> EncodedBody:
+    """Serialize and compress data for one representation."""
+    body, applied = compress(serialize(data, media_type), encoding)
+    return EncodedBody(body, media_type, applied, headers)
+
+class ResponseCache:
+    def __init__(self, max_entries=512, max_bytes=32 * 1024 * 1024):
+        """Least recently used cache of encoded response bodies.
+
+        Keys should include everything the body depends on, e.g. the storage
+        version, the request path and query and the representation, so
+        entries never need to be invalidated; stale ones just age out. The
+        cache holds at most max_entries bodies and max_bytes in total.
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._bytes = 0
+
+    def get(self, key: Hashable) -> Optional[EncodedBody]:
+        with self.lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        metrics.RESPONSE_CACHE.inc(result="hit" if entry is not None else "miss")
+        return entry
+
+    def put(self, key: Hashable, entry: EncodedBody):
+        size = len(entry.body)
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= len(previous.body)
+            self._entries[key] = entry
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted.body)
+
+    def clear(self):
+        with self.lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
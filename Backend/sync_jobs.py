@@ -0,0 +1,272 @@
+import os
+import json
+import socket
+import hashlib
+import datetime
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional, Tuple
+from email_reader import EmailReader
+from sync_pipeline import SyncPipeline
+from file_lock import FileLock
+
+class SyncQueueFullError(Exception):
+    """Raised when too many sync jobs are already waiting to run."""
+
+class SyncJobManager:
+    def __init__(self, extractor, storage, max_workers=2, max_pending=16, job_ttl_seconds=3600,
+                 pipeline_options=None, state_dir=None, stale_seconds=600):
+        """Initialize the background sync runner.
+
+        storage is a ShardedDeadlineStorage; each job writes to the shard of
+        the storage account given to submit(), which is the one the client
+        reads from, not necessarily the mailbox it syncs. At most max_workers syncs run at once and at most
+        max_pending jobs may be queued or running in total. Finished jobs are
+        kept for job_ttl_seconds so clients can read their results.
+        pipeline_options are passed on to each job's SyncPipeline.
+
+        With state_dir set, job state is also written there so every process
+        sharing the directory can report on any job, and a mailbox already
+        syncing in another process is not synced twice. A job is assumed to
+        have died with its process once that process is gone, or, when it
+        runs on another host, once its state has not been written for
+        stale_seconds.
+        """
+        self.extractor = extractor
+        self.storage = storage
+        self.max_pending = max_pending
+        self.job_ttl_seconds = job_ttl_seconds
+        self.pipeline_options = pipeline_options or {}
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="sync-job")
+        self.lock = threading.Lock()
+        self.jobs = {}  # Job ID -> job state
+        self.active_jobs = {}  # Account key -> ID of its queued or running job
+        self.state_dir = state_dir
+        self.stale_seconds = stale_seconds
+        if state_dir:
+            os.makedirs(state_dir, exist_ok=True)
+
+    def submit(self, email_address: str, password: str, imap_server="imap.gmail.com", days=7,
+               storage_account: Optional[str] = None) -> Tuple[Dict[str, Any], bool]:
+        """Queue a sync for a mailbox into the shard of storage_account.
+
+        storage_account None is the default shard. Returns (job snapshot,
+        created). If a sync for the same mailbox is already queued or
+        running, that job is returned and created is False.
+        """
+        account_key = f"{email_address.strip().lower()}@{imap_server}"
+
+        with self.lock:
+            self._prune_finished_jobs()
+
+            active_id = self.active_jobs.get(account_key)
+            if active_id is not None:
+                return self._snapshot(self.jobs[active_id]), False
+
+            if len(self.active_jobs) >= self.max_pending:
+                raise SyncQueueFullError("Too many sync jobs in progress")
+
+            if self.state_dir:
+                # Another process may already be syncing this mailbox
+                with self._account_lock(account_key):
+                    other = self._read_active(account_key)
+                    if other is not None:
+                        return other, False
+                    job_id = f"sync_{uuid.uuid4().hex}"
+                    self._write_file(self._active_path(account_key),
+                                     {"id": job_id, "pid": os.getpid(), "host": socket.gethostname()})
+            else:
+                job_id = f"sync_{uuid.uuid4().hex}"
+
+            job = {
+                "id": job_id,
+                "account": email_address,
+                "status": "queued",
+                "progress": {"fetched": 0, "extracted": 0, "stored": 0},
+                "processed_emails": 0,
+                "stages": None,
+                "added_deadlines": [],
+                "merged_deadlines": 0,
+                "rejected_deadlines": 0,
+                "error": None,
+                "created_at": datetime.datetime.now().isoformat(),
+                "started_at": None,
+                "finished_at": None,
+                "_account_key": account_key,
+                "_storage_account": storage_account,
+                "_finished": None
+            }
+            self.jobs[job["id"]] = job
+            self.active_jobs[account_key] = job["id"]
+            self._persist(job)
+
+        # The password only lives in this closure, never in the job state
+        self.executor.submit(self._run_job, job, password, imap_server, days)
+        return self._snapshot(job), True
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get a snapshot of a job's status, progress and partial results."""
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job:
+                return self._snapshot(job)
+
+        # Maybe another process runs it
+        if self.state_dir and job_id.startswith("sync_") and job_id[5:].isalnum():
+            return self._read_file(self._job_path(job_id))
+        return None
+
+    def shutdown(self, wait=True):
+        """Stop accepting jobs and optionally wait for running ones."""
+        self.executor.shutdown(wait=wait)
+
+    def _run_job(self, job: Dict[str, Any], password: str, imap_server: str, days: int):
+        """Sync one mailbox through the staged pipeline, updating progress as it goes."""
+        self._update(job, status="running", started_at=datetime.datetime.now().isoformat())
+
+        try:
+            reader = EmailReader(job["account"], password, imap_server=imap_server)
+            shard = self.storage.for_account(job["_storage_account"])
+
+            def on_progress(stage, item):
+                with self.lock:
+                    if stage == "fetch":
+                        job["progress"]["fetched"] += 1
+                    elif stage == "extract":
+                        job["progress"]["extracted"] += 1
+                        job["processed_emails"] += 1
+                    elif stage == "store":
+                        # Partial results become visible as each batch is stored
+                        job["added_deadlines"].extend(item["added"])
+                        job["merged_deadlines"] += len(item["merged"])
+                        job["rejected_deadlines"] += len(item["rejected"])
+                        job["progress"]["stored"] += len(item["added"]) + len(item["merged"])
+                    self._persist(job)
+
+            pipeline = SyncPipeline(reader, self.extractor, shard, on_progress=on_progress,
+                                    **self.pipeline_options)
+            pipeline.run(days=days)
+
+            with self.lock:
+                job["stages"] = pipeline.get_stage_metrics()
+
+            self._update(job, status="completed")
+        except Exception as e:
+            print(f"Sync job {job['id']} failed: {e}")
+            self._update(job, status="failed", error=str(e))
+        finally:
+            with self.lock:
+                job["finished_at"] = datetime.datetime.now().isoformat()
+                job["_finished"] = time.monotonic()
+                if self.active_jobs.get(job["_account_key"]) == job["id"]:
+                    del self.active_jobs[job["_account_key"]]
+                self._persist(job)
+
+            if self.state_dir:
+                with self._account_lock(job["_account_key"]):
+                    active = self._read_file(self._active_path(job["_account_key"]))
+                    if active and active.get("id") == job["id"]:
+                        os.remove(self._active_path(job["_account_key"]))
+
+    def _update(self, job: Dict[str, Any], **fields):
+        """Set fields on a job under the lock."""
+        with self.lock:
+            job.update(fields)
+            self._persist(job)
+
+    def _snapshot(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        """Copy the public part of a job. Caller must hold the lock."""
+        snapshot = {k: v for k, v in job.items() if not k.startswith('_')}
+        snapshot["progress"] = dict(job["progress"])
+        snapshot["added_deadlines"] = list(job["added_deadlines"])
+        return snapshot
+
+    def _prune_finished_jobs(self):
+        """Forget finished jobs older than the TTL. Caller must hold the lock."""
+        cutoff = time.monotonic() - self.job_ttl_seconds
+        expired = [job_id for job_id, job in self.jobs.items()
+                   if job["_finished"] is not None and job["_finished"] < cutoff]
+        for job_id in expired:
+            del self.jobs[job_id]
+
+        # Also clear out state left by other processes, including dead ones
+        if self.state_dir:
+            cutoff = time.time() - self.job_ttl_seconds
+            for name in os.listdir(self.state_dir):
+                if name.startswith("sync_") and name.endswith(".json"):
+                    path = os.path.join(self.state_dir, name)
+                    try:
+                        if os.path.getmtime(path) < cutoff:
+                            os.remove(path)
+                    except OSError:
+                        pass
+
+    def _persist(self, job: Dict[str, Any]):
+        """Share a job's state with other processes. Caller must hold the lock."""
+        if self.state_dir:
+            self._write_file(self._job_path(job["id"]), self._snapshot(job))
+
+    def _read_active(self, account_key: str) -> Optional[Dict[str, Any]]:
+        """The live job of an account in any process, if any. Caller must hold the account lock."""
+        active = self._read_file(self._active_path(account_key))
+        if not active:
+            return None
+        path = self._job_path(active.get("id", ""))
+        job = self._read_file(path)
+        if not job or job.get("status") not in ("queued", "running"):
+            return None
+        alive = self._owner_alive(active)
+        if alive is not None:
+            return job if alive else None
+        # Queued jobs write nothing while they wait, so this only suits other hosts
+        try:
+            if time.time() - os.path.getmtime(path) > self.stale_seconds:
+                return None
+        except OSError:
+            return None
+        return job
+
+    def _owner_alive(self, active: Dict[str, Any]) -> Optional[bool]:
+        """Whether the process that owns an active job still runs, None if it cannot be told."""
+        pid = active.get("pid")
+        if not pid or active.get("host") != socket.gethostname() or os.name != "posix":
+            return None
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+        except OSError:
+            return None
+        return True
+
+    def _job_path(self, job_id: str) -> str:
+        return os.path.join(self.state_dir, f"{job_id}.json")
+
+    def _active_path(self, account_key: str) -> str:
+        digest = hashlib.sha1(account_key.encode('utf-8')).hexdigest()[:16]
+        return os.path.join(self.state_dir, f"active_{digest}.json")
+
+    def _account_lock(self, account_key: str) -> FileLock:
+        return FileLock(self._active_path(account_key) + ".lock")
+
+    def _write_file(self, path: str, data: Dict[str, Any]):
+        """Atomically replace a JSON state file."""
+        try:
+            fd, tmp_path = tempfile.mkstemp(prefix=".sync_", suffix=".tmp", dir=self.state_dir)
+            with os.fdopen(fd, 'w') as f:
+                json.dump(data, f, default=str)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Error writing sync job state: {e}")
+
+    def _read_file(self, path: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(path, 'r') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
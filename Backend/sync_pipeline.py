@@ -0,0 +1,258 @@
+import time
+import queue
+import threading
+from typing import Dict, Any, Optional, Callable
+import metrics
+
+# Marks the end of a stage's input
+_END = object()
+
+class PipelineStage:
+    def __init__(self, name: str, func: Callable[[Any], Any], workers=1, queue_size=32):
+        """One pipeline stage: a bounded input queue served by a pool of workers.
+
+        func turns one input item into one output item; returning None drops
+        the item. Exceptions are counted and the item is dropped.
+        """
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.input = queue.Queue(maxsize=queue_size)
+        self.next_stage = None
+        self.lock = threading.Lock()
+        self._active_workers = workers
+        self._threads = []
+
+        # Metrics
+        self.items_in = 0
+        self.items_out = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+        self.started_at = None
+        self.finished_at = None
+
+    def start(self):
+        """Start the stage's workers."""
+        self.started_at = time.perf_counter()
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._run_worker, name=f"{self.name}-{index}")
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def join(self):
+        """Wait until every worker has finished."""
+        for thread in self._threads:
+            thread.join()
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Item counts and utilization (busy time over worker time) of this stage."""
+        end = self.finished_at or time.perf_counter()
+        wall = max(end - (self.started_at or end), 1e-9)
+        return {
+            "workers": self.workers,
+            "items_in": self.items_in,
+            "items_out": self.items_out,
+            "errors": self.errors,
+            "busy_seconds": round(self.busy_seconds, 3),
+            "utilization": round(self.busy_seconds / (wall * self.workers), 3)
+        }
+
+    def _run_worker(self):
+        """Process items until the end marker arrives."""
+        while True:
+            item = self.input.get()
+            if item is _END:
+                break
+
+            start = time.perf_counter()
+            try:
+                result = self.func(item)
+            except Exception as e:
+                print(f"Error in {self.name} stage: {e}")
+                result = None
+                with self.lock:
+                    self.errors += 1
+            elapsed = time.perf_counter() - start
+
+            with self.lock:
+                self.items_in += 1
+                self.busy_seconds += elapsed
+                if result is not None:
+                    self.items_out += 1
+
+            # Blocks when the next stage is behind, which is the backpressure
+            if result is not None and self.next_stage is not None:
+                self.next_stage.input.put(result)
+
+        # The last worker out tells the next stage there is nothing more
+        with self.lock:
+            self._active_workers -= 1
+            last = self._active_workers == 0
+            if last:
+                self.finished_at = time.perf_counter()
+        if last and self.next_stage is not None:
+            for _ in range(self.next_stage.workers):
+                self.next_stage.input.put(_END)
+
+class SyncPipeline:
+    def __init__(self, reader, extractor, storage, parse_workers=2, extract_workers=4,
+                 store_batch_size=20, queue_size=32,
+                 on_progress: Optional[Callable[[str, Any], None]] = None):
+        """Run fetch -> parse -> extract -> store as concurrent stages.
+
+        Stages are connected by bounded queues of queue_size items, so a slow
+        stage holds back the ones before it instead of buffering the whole
+        mailbox. Fetching uses the reader's single IMAP connection on one
+        thread; parsing and LLM extraction run on parse_workers and
+        extract_workers threads; storing groups records into upserts of up to
+        store_batch_size. on_progress(stage, item) is called as items leave
+        the "fetch", "parse" and "extract" stages (item is the message id,
+        the email dict and the extracted records) and after each "store"
+        upsert (item is the upsert result).
+        """
+        self.reader = reader
+        self.extractor = extractor
+        self.storage = storage
+        self.store_batch_size = store_batch_size
+        self.on_progress = on_progress
+        self._stopped = threading.Event()
+
+        self.parse_stage = PipelineStage("parse", self._parse, workers=parse_workers, queue_size=queue_size)
+        self.extract_stage = PipelineStage("extract", self._extract, workers=extract_workers, queue_size=queue_size)
+        self.store_stage = PipelineStage("store", self._store, workers=1, queue_size=queue_size)
+        self.parse_stage.next_stage = self.extract_stage
+        self.extract_stage.next_stage = self.store_stage
+
+        # Fetching is driven from run(), so it only needs counters
+        self.fetch_metrics = {"items_out": 0, "busy_seconds": 0.0, "started_at": None, "finished_at": None}
+
+        self.results = {"processed_emails": 0, "added": [], "merged": 0, "rejected": 0}
+        self._results_lock = threading.Lock()
+        self._store_error = None  # First failed upsert; fails the whole run
+
+    def run(self, folder="INBOX", days=7, limit=50) -> Dict[str, Any]:
+        """Sync a mailbox and wait for every stage to drain, returns the totals.
+
+        Raises RuntimeError if storing deadlines failed, since the extracted
+        records would otherwise be lost without a trace.
+        """
+        stages = [self.parse_stage, self.extract_stage, self.store_stage]
+        for stage in stages:
+            stage.start()
+
+        fetch = self.fetch_metrics
+        fetch["started_at"] = time.perf_counter()
+        try:
+            raw_emails = self.reader.iter_raw_emails(folder, days=days, limit=limit)
+            while not self._stopped.is_set():
+                start = time.perf_counter()
+                try:
+                    message_id, raw_email = next(raw_emails)
+                except StopIteration:
+                    break
+                finally:
+                    fetch["busy_seconds"] += time.perf_counter() - start
+                fetch["items_out"] += 1
+                self._report("fetch", message_id)
+                self.parse_stage.input.put((message_id, raw_email))
+        finally:
+            fetch["finished_at"] = time.perf_counter()
+            # Drain: everything already fetched still goes through the pipeline
+            for _ in range(self.parse_stage.workers):
+                self.parse_stage.input.put(_END)
+            for stage in stages:
+                stage.join()
+
+        if self._store_error is not None:
+            raise RuntimeError(f"Storing deadlines failed: {self._store_error}")
+        return self.get_results()
+
+    def stop(self):
+        """Stop fetching new emails; emails already fetched are still processed."""
+        self._stopped.set()
+
+    def get_results(self) -> Dict[str, Any]:
+        """Totals so far."""
+        with self._results_lock:
+            return {
+                "processed_emails": self.results["processed_emails"],
+                "added_deadlines": list(self.results["added"]),
+                "merged_deadlines": self.results["merged"],
+                "rejected_deadlines": self.results["rejected"]
+            }
+
+    def get_stage_metrics(self) -> Dict[str, Dict[str, Any]]:
+        """Per-stage counts and utilization; the busiest stage is the bottleneck."""
+        fetch = self.fetch_metrics
+        end = fetch["finished_at"] or time.perf_counter()
+        wall = max(end - (fetch["started_at"] or end), 1e-9)
+        metrics = {"fetch": {
+            "workers": 1,
+            "items_in": fetch["items_out"],
+            "items_out": fetch["items_out"],
+            "errors": 0,
+            "busy_seconds": round(fetch["busy_seconds"], 3),
+            "utilization": round(fetch["busy_seconds"] / wall, 3)
+        }}
+        for stage in (self.parse_stage, self.extract_stage, self.store_stage):
+            metrics[stage.name] = stage.get_metrics()
+        return metrics
+
+    def _parse(self, item):
+        message_id, raw_email = item
+        email_data = self.reader.parse_email(message_id, raw_email)
+        self._report("parse", email_data)
+        return email_data
+
+    def _extract(self, email_data):
+        records = self.extractor.extract_deadline_records(email_data)
+        with self._results_lock:
+            self.results["processed_emails"] += 1
+        self._report("extract", records)
+        return records or None
+
+    def _store(self, records):
+        # Fold whatever else is already waiting into the same upsert
+        batch = list(records)
+        end_seen = False
+        while len(batch) < self.store_batch_size:
+            try:
+                more = self.store_stage.input.get_nowait()
+            except queue.Empty:
+                break
+            if more is _END:
+                end_seen = True
+                break
+            batch.extend(more)
+
+        try:
+            with metrics.tracer.span("store", records=len(batch)) as span:
+                result = self.storage.upsert_deadlines(batch)
+                if metrics.tracer.enabled:
+                    span.set(email_ids=sorted({record.source_email_id for record in batch if record.source_email_id}))
+            with self._results_lock:
+                self.results["added"].extend(result["added"])
+                self.results["merged"] += len(result["merged"])
+                self.results["rejected"] += len(result["rejected"])
+            self._report("store", result)
+            if result.get("error"):
+                raise RuntimeError(result["error"])
+        except Exception as e:
+            # Stop fetching; there is no point extracting what cannot be stored
+            if self._store_error is None:
+                self._store_error = e
+            self._stopped.set()
+            raise
+        finally:
+            if end_seen:
+                # Put the end marker back for the worker loop
+                self.store_stage.input.put(_END)
+        return result
+
+    def _report(self, stage: str, item):
+        if self.on_progress:
+            try:
+                self.on_progress(stage, item)
+            except Exception as e:
+                print(f"Error in pipeline progress callback: {e}")
@@ -3,6 +3,7 @@ from email_reader import EmailReader
 from deadline_extractor import DeadlineExtractor
 from deadline_storage import DeadlineStorage
 from notification_engine import NotificationEngine
+from sync_pipeline import SyncPipeline
 import json
 
 # Email credentials from the code
@@ -23,33 +24,31 @@ extractor = DeadlineExtractor()
 notification_engine = NotificationEngine(storage)
 notification_engine.add_notification_handler(print_notification)
 
-# Connect to email and fetch recent messages
+# Fetch, parse, extract and store recent messages as a pipeline
 print(f"Connecting to email {EMAIL}...")
 reader = EmailReader(EMAIL, PASSWORD)
-emails = reader.get_recent_emails(days=30, limit=50)  # Get more emails for testing
-print(f"Found {len(emails)} recent emails")
 
-# Process each email
 print("Processing emails for deadlines...")
 total_deadlines = 0
-new_deadlines = 0
 
-for i, email_data in enumerate(emails):
-    print(f"\nEmail {i+1}/{len(emails)}: {email_data['subject']}")
-    deadlines = extractor.extract_deadlines(email_data)
-    total_deadlines += len(deadlines)
-    
-    if deadlines:
-        count = storage.add_multiple_deadlines(deadlines)
-        new_deadlines += count
-        print(f"  Found {len(deadlines)} deadlines, {count} new ones added")
-        
-        for dl in deadlines:
-            print(f"  - Task: {dl['task']}")
-            print(f"    Due: {dl['deadline']}")
-            print(f"    Confidence: {dl.get('confidence', 'unknown')}")
-    else:
-        print("  No deadlines found")
+def print_progress(stage, item):
+    global total_deadlines
+    if stage == "extract":
+        total_deadlines += len(item)
+        for dl in item:
+            print(f"  - Task: {dl.task}")
+            print(f"    Due: {dl.deadline}")
+            print(f"    Confidence: {dl.confidence.value}")
+
+pipeline = SyncPipeline(reader, extractor, storage, on_progress=print_progress)
+results = pipeline.run(days=30, limit=50)  # Get more emails for testing
+new_deadlines = len(results["added_deadlines"])
+print(f"Processed {results['processed_emails']} recent emails")
+
+# Show where the time went
+print("\nStage utilization:")
+for stage, metrics in pipeline.get_stage_metrics().items():
+    print(f"  {stage}: {metrics['items_out']} items, {metrics['utilization']:.0%} busy")
 
 print(f"\nTotal deadlines found: {total_deadlines}")
 print(f"New deadlines added: {new_deadlines}")
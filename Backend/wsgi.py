@@ -0,0 +1,10 @@
+"""WSGI entry point for running the API with several worker processes.
+
+    gunicorn -c gunicorn.conf.py
+
+Every worker imports this module after it has been forked, so each one
+starts its own background threads.
+"""
+from api_server import app, start_background_services
+
+start_background_services()